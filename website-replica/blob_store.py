@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Content-Addressed Image Store
+Keeps each unique image payload once under its SHA-256 and places product,
+category and banner names as hardlinks to it. Because the names share one
+inode, editing any of them in place changes every alias; pass
+hardlink=False to get independent reflinks/copies instead.
+"""
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from file_placement import file_digest, place_file
+
+# Returned by fetch_once when a URL fetched earlier in the run was reused
+LINKED = "linked"
+
+class BlobStore:
+    def __init__(self, root, hardlink=True):
+        self.root = Path(root)
+        self.hardlink = hardlink
+        self.objects_dir = self.root / "objects"
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.manifest_file = self.root / "manifest.json"
+
+        self._lock = threading.Lock()
+        self._url_locks = {}
+        self._fetched = {}
+
+        # path -> [inode, mtime_ns, digest], so unchanged files are never re-hashed
+        self.manifest = {}
+        if self.manifest_file.exists():
+            try:
+                with open(self.manifest_file, 'r') as f:
+                    self.manifest = json.load(f)
+            except (OSError, ValueError):
+                self.manifest = {}
+
+    def blob_path(self, digest):
+        """Get the storage path for a payload digest"""
+        return self.objects_dir / digest[:2] / digest
+
+    def _remember(self, filename, digest):
+        stat = os.stat(filename)
+        with self._lock:
+            self.manifest[str(filename)] = [stat.st_ino, stat.st_mtime_ns, digest]
+
+    def digest_of(self, filename):
+        """Get the SHA-256 of a file, using the manifest when it is unchanged"""
+        stat = os.stat(filename)
+        recorded = self.manifest.get(str(filename))
+        if recorded and recorded[:2] == [stat.st_ino, stat.st_mtime_ns]:
+            return recorded[2]
+
+        return file_digest(filename)
+
+    def commit(self, tmp_path, digest, filename):
+        """Move a freshly downloaded temp file into the store and link it to filename"""
+        blob = self.blob_path(digest)
+        blob.parent.mkdir(exist_ok=True)
+
+        if blob.exists():
+            os.unlink(tmp_path)
+        else:
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, blob)
+
+        self.link(digest, filename)
+
+    def link(self, digest, filename):
+        """Point filename at a stored blob, replacing it atomically"""
+        place_file(self.blob_path(digest), filename, hardlink=self.hardlink)
+        self._remember(filename, digest)
+
+    def add_file(self, filename):
+        """Adopt an existing file into the store and return its digest"""
+        digest = self.digest_of(filename)
+        blob = self.blob_path(digest)
+
+        if blob.exists():
+            # Collapse a duplicate payload onto the stored blob
+            self.link(digest, filename)
+        else:
+            blob.parent.mkdir(exist_ok=True)
+            place_file(filename, blob, hardlink=self.hardlink)
+            self._remember(filename, digest)
+
+        return digest
+
+    def place(self, src, dst):
+        """Make dst an alias of src's payload without copying bytes"""
+        digest = self.add_file(src)
+        self.link(digest, dst)
+        return digest
+
+    @contextmanager
+    def _url_lock(self, url):
+        with self._lock:
+            lock = self._url_locks.setdefault(url, threading.Lock())
+        with lock:
+            yield
+
+    def fetch_once(self, url, filename, fetch):
+        """Call fetch(url, filename) once per URL per run and link repeats to it"""
+        with self._url_lock(url):
+            digest = self._fetched.get(url)
+            if digest is not None and self.blob_path(digest).exists():
+                self.link(digest, filename)
+                return LINKED
+
+            result = fetch(url, filename)
+            if result:
+                self._fetched[url] = self.add_file(filename)
+            return result
+
+    def save(self):
+        """Write the path -> digest manifest"""
+        with self._lock:
+            tmp_path = self.manifest_file.with_suffix(".tmp")
+            with open(tmp_path, 'w') as f:
+                json.dump(self.manifest, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.manifest_file)
+
+    def stats(self):
+        """Count stored blobs and the names pointing at them"""
+        blobs = sum(1 for path in self.objects_dir.glob("*/*") if path.is_file())
+        return {"blobs": blobs, "names": len(self.manifest)}
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Critical CSS Inliner
+Works out which styles.css rules style the above-the-fold part of each
+replica page, inlines them into <head> and switches the full stylesheet to
+an asynchronous load so it no longer blocks first render.
+
+Runs on the dist/ build after fingerprint_assets.py, reading the
+fingerprinted sheet named in asset-manifest.json, so the source pages stay
+untouched and the inlined rules are redone from the current sheet on every
+build; html_minifier.py runs next.
+"""
+
+import argparse
+import json
+from pathlib import Path
+
+import lxml.html
+
+from css_rules import AtRule, SelectorMatcher, StyleRule, animation_names, is_keyframes, minify, parse_stylesheet
+from update_html_images import PAGE_RULES, parse_page, serialize_page, write_if_changed
+
+STYLESHEET = "styles.css"
+
+# Written by fingerprint_assets.py: source path -> fingerprinted path
+ASSET_MANIFEST = "asset-manifest.json"
+
+# Sections of <main> treated as visible on first paint, after the header
+FOLD_SECTIONS = 1
+
+# Inline CSS beyond this no longer fits the first round trip
+CRITICAL_BUDGET = 14 * 1024
+
+ASYNC_ONLOAD = "this.onload=null;this.rel='stylesheet'"
+
+def fold_elements(doc):
+    """Elements rendered in the first viewport: header plus the first main sections"""
+    body = doc.body
+    main = body.find('.//main')
+    container = main if main is not None else body
+
+    roots = [el for el in body if el.tag == 'header']
+    roots.extend([el for el in container if isinstance(el.tag, str) and el.tag != 'header'][:FOLD_SECTIONS])
+
+    fold = {doc, body}
+    if main is not None:
+        fold.add(main)
+    for root in roots:
+        fold.update(el for el in root.iter() if isinstance(el.tag, str))
+    return fold
+
+class CriticalCSSInliner:
+    def __init__(self, base_dir="dist", stylesheet=STYLESHEET):
+        self.base_dir = Path(base_dir)
+        self.stylesheet = stylesheet
+        self.matcher = SelectorMatcher()
+
+        # Built pages link the fingerprinted name of the sheet
+        manifest_file = self.base_dir / ASSET_MANIFEST
+        if manifest_file.exists():
+            with open(manifest_file, 'r') as f:
+                self.stylesheet = json.load(f).get(stylesheet, stylesheet)
+
+        with open(self.base_dir / self.stylesheet, 'r', encoding='utf-8') as f:
+            self.rules = parse_stylesheet(f.read())
+
+    def _critical_rules(self, rules, doc, fold):
+        """Keep the rules, and only the selectors, that hit a fold element"""
+        critical = []
+        for rule in rules:
+            if isinstance(rule, StyleRule):
+                selectors = []
+                for selector in rule.selectors:
+                    elements = self.matcher.select(selector, doc)
+                    if elements is None or any(el in fold for el in elements):
+                        selectors.append(selector)
+                if selectors:
+                    critical.append(StyleRule(selectors, rule.declarations))
+            elif rule.rules is not None:
+                nested = self._critical_rules(rule.rules, doc, fold)
+                if nested:
+                    critical.append(AtRule(rule.prelude, rules=nested))
+            elif rule.name == '@font-face':
+                critical.append(rule)
+        # @import stays in the async stylesheet so the font request never blocks render
+
+        return critical
+
+    def _keyframes(self, critical):
+        """@keyframes blocks referenced by the critical rules' animations"""
+        names = animation_names(critical)
+        return [rule for rule in self.rules if is_keyframes(rule) and rule.prelude.split()[-1] in names]
+
+    def _reset_head(self, doc):
+        """Undo a previous run so the page is rebuilt from its plain stylesheet link"""
+        head = doc.head
+        for el in head.xpath('style[@data-critical]'):
+            head.remove(el)
+        for el in head.xpath('noscript[link[@rel="stylesheet"]]'):
+            if el[0].get('href') == self.stylesheet:
+                # Hand the noscript's trailing whitespace back to the link before it
+                el.getprevious().tail = el.tail
+                head.remove(el)
+
+        for link in head.xpath('link[@href=$href]', href=self.stylesheet):
+            if link.get('rel') in ('stylesheet', 'preload'):
+                for attr in ('as', 'onload'):
+                    link.attrib.pop(attr, None)
+                link.set('rel', 'stylesheet')
+                return link
+        return None
+
+    def inline_page(self, page_name):
+        """Inline critical rules into one page; returns the critical CSS size or None"""
+        page = self.base_dir / page_name
+        if not page.exists():
+            return None
+
+        with open(page, 'r', encoding='utf-8') as f:
+            doc = parse_page(f.read())
+
+        link = self._reset_head(doc)
+        if link is None:
+            return None
+
+        critical = self._critical_rules(self.rules, doc, fold_elements(doc))
+        css = minify(self._keyframes(critical) + critical)
+
+        style = lxml.html.Element('style')
+        style.set('data-critical', self.stylesheet)
+        style.text = css
+        style.tail = "\n    "
+        link.addprevious(style)
+
+        # Load the full sheet without blocking; <noscript> keeps it working without JS
+        link.set('rel', 'preload')
+        link.set('as', 'style')
+        link.set('onload', ASYNC_ONLOAD)
+        noscript = lxml.html.Element('noscript')
+        noscript.append(lxml.html.Element('link', rel='stylesheet', href=self.stylesheet))
+        noscript.tail, link.tail = link.tail, "\n    "
+        link.addnext(noscript)
+
+        if write_if_changed(page, serialize_page(doc)):
+            print(f"✓ Inlined {len(css):,} bytes of critical CSS into {page_name}")
+        else:
+            print(f"↺ {page_name} critical CSS already current")
+
+        if len(css) > CRITICAL_BUDGET:
+            print(f"⚠️ {page_name} critical CSS exceeds {CRITICAL_BUDGET:,} bytes")
+        return len(css)
+
+    def inline_all_pages(self):
+        """Inline critical CSS into every page the image updater manages"""
+        print("🎨 Inlining critical CSS...")
+
+        inlined = 0
+        for page_name in PAGE_RULES:
+            try:
+                if self.inline_page(page_name) is None:
+                    print(f"❌ {page_name} not found or has no {self.stylesheet} link")
+                else:
+                    inlined += 1
+            except Exception as e:
+                print(f"❌ {page_name}: {e}")
+
+        print(f"✅ Critical CSS inlined into {inlined}/{len(PAGE_RULES)} pages")
+        return inlined == len(PAGE_RULES)
+
+def main():
+    parser = argparse.ArgumentParser(description='Inline critical CSS and load the full stylesheet asynchronously')
+    parser.add_argument('--base', '-b', default='dist', help='Build directory written by fingerprint_assets.py')
+
+    args = parser.parse_args()
+
+    CriticalCSSInliner(args.base).inline_all_pages()
+
+if __name__ == "__main__":
+    main()
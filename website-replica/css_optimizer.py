@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Stylesheet Optimizer
+Prunes styles.css rules that match no element on any replica page, merges
+repeated selectors, minifies the result and reports the bytes saved for
+each commented rule group. The output, styles.min.css, is what
+fingerprint_assets.py publishes in place of styles.css.
+"""
+
+import argparse
+import re
+from collections import defaultdict
+from pathlib import Path
+
+from css_rules import (AtRule, SelectorMatcher, StyleRule, animation_names, is_keyframes, minify,
+                       minify_rule, parse_stylesheet)
+from update_html_images import parse_page, write_if_changed
+
+# Class and id names in a selector, checked against page scripts
+SELECTOR_NAMES = re.compile(r'[.#](-?[_a-zA-Z][\w-]*)')
+
+SCRIPT_TOKENS = re.compile(r'[\w-]+')
+
+def property_family(name):
+    """Shorthand a property belongs to: background-color → background; custom properties stand alone"""
+    return name if name.startswith('--') else name.split('-')[0]
+
+def merge_declarations(earlier, later):
+    """Append later declarations, dropping earlier ones they override.
+
+    Repeats within one block are kept, since those are deliberate fallbacks
+    (display:-webkit-box;display:flex); an !important value is only
+    overridden by another !important one.
+    """
+    overridden = {name for name, value in later}
+    important = {name for name, value in later if value.endswith('!important')}
+    kept = [(name, value) for name, value in earlier
+            if name not in overridden or (value.endswith('!important') and name not in important)]
+    return kept + list(later)
+
+class CSSOptimizer:
+    def __init__(self, base_dir=".", stylesheet="styles.css", output="styles.min.css"):
+        self.base_dir = Path(base_dir)
+        self.stylesheet = self.base_dir / stylesheet
+        self.output = self.base_dir / output
+        self.matcher = SelectorMatcher()
+
+        self.pages = []
+        self.script_tokens = set()
+
+    def _load_pages(self):
+        """Parse every page and collect the words its scripts use"""
+        for path in sorted(self.base_dir.glob("*.html")):
+            with open(path, 'r', encoding='utf-8') as f:
+                doc = parse_page(f.read())
+            self.pages.append(doc)
+
+            for script in doc.iter('script'):
+                self.script_tokens.update(SCRIPT_TOKENS.findall(script.text or ''))
+                src = script.get('src')
+                if src and (self.base_dir / src).is_file():
+                    with open(self.base_dir / src, 'r', encoding='utf-8') as f:
+                        self.script_tokens.update(SCRIPT_TOKENS.findall(f.read()))
+
+    def _is_used(self, selector):
+        """A selector is live if it matches a page or names a class/id scripts toggle"""
+        if any(self.matcher.matches(selector, doc) for doc in self.pages):
+            return True
+        return any(name in self.script_tokens for name in SELECTOR_NAMES.findall(selector))
+
+    def _prune(self, rules):
+        """Drop dead selectors, then rules and groups left with nothing"""
+        kept = []
+        for rule in rules:
+            if isinstance(rule, StyleRule):
+                selectors = [s for s in rule.selectors if self._is_used(s)]
+                if selectors:
+                    rule.selectors = selectors
+                    kept.append(rule)
+            elif rule.rules is not None:
+                rule.rules = self._prune(rule.rules)
+                if rule.rules:
+                    kept.append(rule)
+            else:
+                kept.append(rule)
+        return kept
+
+    def _merge(self, rules):
+        """Fold rules with the same selector list into the first one.
+
+        Moving declarations earlier is only safe when no rule in between sets
+        a property of the same family (background vs background-color), so
+        those duplicates are left alone.
+        """
+        merged = []
+        for rule in rules:
+            if isinstance(rule, AtRule) and rule.rules is not None:
+                rule.rules = self._merge(rule.rules)
+            if not isinstance(rule, StyleRule):
+                merged.append(rule)
+                continue
+
+            families = {property_family(name) for name, _ in rule.declarations}
+            target = None
+            for index in range(len(merged) - 1, -1, -1):
+                previous = merged[index]
+                if isinstance(previous, StyleRule) and previous.selectors == rule.selectors:
+                    target = previous
+                    break
+                if families & self._families(previous):
+                    break
+
+            if target is None:
+                merged.append(rule)
+            else:
+                target.declarations = merge_declarations(target.declarations, rule.declarations)
+        return merged
+
+    def _families(self, rule):
+        if isinstance(rule, StyleRule):
+            return {property_family(name) for name, _ in rule.declarations}
+        if rule.rules is not None:
+            return set().union(*(self._families(r) for r in rule.rules))
+        return set()
+
+    def _drop_unused_keyframes(self, rules):
+        names = animation_names(rules)
+        return [rule for rule in rules if not is_keyframes(rule) or rule.prelude.split()[-1] in names]
+
+    def optimize(self):
+        """Prune, merge and minify the stylesheet, then report the savings"""
+        print("✂️ Optimizing stylesheet...")
+
+        if not self.stylesheet.exists():
+            print(f"❌ {self.stylesheet} not found")
+            return None
+
+        with open(self.stylesheet, 'r', encoding='utf-8') as f:
+            source = f.read()
+
+        rules = parse_stylesheet(source)
+        before = defaultdict(int)
+        for rule in rules:
+            before[rule.group or "(ungrouped)"] += rule.source_length
+
+        self._load_pages()
+        optimized = self._drop_unused_keyframes(self._merge(self._prune(rules)))
+        output = minify(optimized) + "\n"
+
+        after = defaultdict(int)
+        for rule in optimized:
+            after[rule.group or "(ungrouped)"] += len(minify_rule(rule).encode('utf-8'))
+
+        print(f"{'Rule group':<40} {'Before':>8} {'After':>8} {'Saved':>8}")
+        for group, size in sorted(before.items(), key=lambda item: item[1] - after[item[0]], reverse=True):
+            print(f"{group[:40]:<40} {size:>8,} {after[group]:>8,} {size - after[group]:>8,}")
+
+        source_size = len(source.encode('utf-8'))
+        output_size = len(output.encode('utf-8'))
+        print(f"✓ {source_size:,} → {output_size:,} bytes ({source_size - output_size:,} saved) "
+              f"across {len(self.pages)} pages")
+
+        if write_if_changed(self.output, output):
+            print(f"📁 Written to: {self.output}")
+        else:
+            print(f"↺ {self.output} already current")
+        return source_size - output_size
+
+def main():
+    parser = argparse.ArgumentParser(description='Prune, merge and minify styles.css')
+    parser.add_argument('--base', '-b', default='.', help='Directory containing the pages and stylesheet')
+    parser.add_argument('--stylesheet', '-s', default='styles.css', help='Stylesheet to optimize')
+    parser.add_argument('--output', '-o', default='styles.min.css', help='Optimized stylesheet to write')
+
+    args = parser.parse_args()
+
+    CSSOptimizer(args.base, args.stylesheet, args.output).optimize()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Stylesheet Rule Parser
+Splits styles.css into style rules and at-rules, matches selectors against
+lxml page trees and serializes rules back to readable or minified text.
+Shared by the critical CSS and stylesheet optimizer stages.
+"""
+
+import re
+
+from cssselect import GenericTranslator, SelectorError
+from lxml import etree
+
+# At-rules whose block holds ordinary style rules
+GROUPING_AT_RULES = ("@media", "@supports", "@layer", "@document")
+
+# State-dependent pseudo-classes: match the element as if the state were active
+DYNAMIC_PSEUDO = re.compile(
+    r':(?:hover|focus|focus-within|focus-visible|active|visited|link|target|checked|'
+    r'disabled|enabled|placeholder-shown|invalid|valid|required|optional)\b'
+)
+
+# Pseudo-elements style a part of their element; matching the element is enough
+PSEUDO_ELEMENT = re.compile(
+    r'::?(?:before|after|first-line|first-letter|placeholder|selection|marker|backdrop|'
+    r'-webkit-[a-z-]+|-moz-[a-z-]+)\b'
+)
+
+ANIMATION_NAME = re.compile(r'[\w-]+')
+
+COMMENT = re.compile(r'/\*(.*?)\*/', re.S)
+
+# Quoted strings are copied through minification untouched
+STRING = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')')
+
+class StyleRule:
+    """A selector list with its declaration block"""
+
+    def __init__(self, selectors, declarations, group=None, source_length=0):
+        self.selectors = selectors
+        self.declarations = declarations
+        # Heading comment the rule sits under, and its size in the source text
+        self.group = group
+        self.source_length = source_length
+
+    def __repr__(self):
+        return f"StyleRule({', '.join(self.selectors)!r})"
+
+class AtRule:
+    """An at-rule: a statement (@import), a nested rule group (@media) or a raw block"""
+
+    def __init__(self, prelude, rules=None, block=None, group=None, source_length=0):
+        self.prelude = prelude
+        self.rules = rules
+        self.block = block
+        self.group = group
+        self.source_length = source_length
+
+    @property
+    def name(self):
+        return self.prelude.split(None, 1)[0].lower()
+
+    def __repr__(self):
+        return f"AtRule({self.prelude!r})"
+
+def animation_names(rules):
+    """Words used by animation declarations, nested groups included"""
+    names = set()
+    stack = list(rules)
+    while stack:
+        rule = stack.pop()
+        if isinstance(rule, StyleRule):
+            for name, value in rule.declarations:
+                if name in ('animation', 'animation-name'):
+                    names.update(ANIMATION_NAME.findall(value))
+        elif rule.rules is not None:
+            stack.extend(rule.rules)
+    return names
+
+def is_keyframes(rule):
+    return isinstance(rule, AtRule) and rule.name.endswith('keyframes')
+
+def _skip_string(css, i):
+    quote = css[i]
+    i += 1
+    while i < len(css) and css[i] != quote:
+        i += 2 if css[i] == '\\' else 1
+    return i + 1
+
+def _find(css, i, stops):
+    """Index of the next stop character outside strings and comments"""
+    while i < len(css):
+        char = css[i]
+        if char in stops:
+            return i
+        if char in '"\'':
+            i = _skip_string(css, i)
+        elif css.startswith('/*', i):
+            end = css.find('*/', i + 2)
+            i = len(css) if end == -1 else end + 2
+        else:
+            i += 1
+    return len(css)
+
+def _block_end(css, i):
+    """Index of the brace closing the block that starts just after i"""
+    depth = 1
+    while i < len(css):
+        i = _find(css, i, '{}')
+        if i == len(css):
+            break
+        depth += 1 if css[i] == '{' else -1
+        if depth == 0:
+            return i
+        i += 1
+    return len(css)
+
+def split_selectors(text):
+    """Split a selector list on top-level commas"""
+    selectors, depth, start = [], 0, 0
+    for i, char in enumerate(text):
+        if char in '([':
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            selectors.append(text[start:i])
+            start = i + 1
+    selectors.append(text[start:])
+    return [' '.join(s.split()) for s in selectors if s.strip()]
+
+def parse_stylesheet(css, group=None):
+    """Parse CSS text into a list of StyleRule and AtRule objects"""
+    rules = []
+    i = 0
+    while i < len(css):
+        stop = _find(css, i, '{;}')
+        if stop == len(css):
+            break
+
+        # A comment ahead of a rule names the group it and the following rules belong to
+        comments = COMMENT.findall(css, i, stop)
+        if comments:
+            group = ' '.join(comments[-1].split())
+        prelude = COMMENT.sub('', css[i:stop]).strip()
+
+        if css[stop] == '}':
+            # Stray closing brace (an older appended block left one behind)
+            i = stop + 1
+            continue
+        if css[stop] == ';':
+            if prelude.startswith('@'):
+                rules.append(AtRule(' '.join(prelude.split()), group=group, source_length=stop + 1 - i))
+            i = stop + 1
+            continue
+
+        end = _block_end(css, stop + 1)
+        body = css[stop + 1:end]
+        source_length = end + 1 - i
+        if prelude.startswith('@'):
+            prelude = ' '.join(prelude.split())
+            if prelude.lower().startswith(GROUPING_AT_RULES):
+                rules.append(AtRule(prelude, rules=parse_stylesheet(body, group),
+                                    group=group, source_length=source_length))
+            else:
+                rules.append(AtRule(prelude, block=COMMENT.sub('', body).strip(),
+                                    group=group, source_length=source_length))
+        elif prelude:
+            rules.append(StyleRule(split_selectors(prelude), parse_declarations(body),
+                                   group=group, source_length=source_length))
+        i = end + 1
+
+    return rules
+
+def parse_declarations(body):
+    """Split a declaration block into (property, value) pairs"""
+    declarations = []
+    body = COMMENT.sub('', body)
+    i = 0
+    while i < len(body):
+        end = _find(body, i, ';')
+        name, sep, value = body[i:end].partition(':')
+        name = name.strip()
+        if sep and name:
+            # Custom property names are case-sensitive
+            declarations.append((name if name.startswith('--') else name.lower(), ' '.join(value.split())))
+        i = end + 1
+    return declarations
+
+def serialize(rules, indent=""):
+    """Turn parsed rules back into readable CSS text"""
+    out = []
+    for rule in rules:
+        if isinstance(rule, StyleRule):
+            body = ''.join(f"{indent}    {name}: {value};\n" for name, value in rule.declarations)
+            selectors = (",\n" + indent).join(rule.selectors)
+            out.append(f"{indent}{selectors} {{\n{body}{indent}}}\n")
+        elif rule.rules is not None:
+            out.append(f"{indent}{rule.prelude} {{\n{serialize(rule.rules, indent + '    ')}{indent}}}\n")
+        elif rule.block is not None:
+            out.append(f"{indent}{rule.prelude} {{\n{indent}    {rule.block}\n{indent}}}\n")
+        else:
+            out.append(f"{indent}{rule.prelude};\n")
+    return '\n'.join(out)
+
+def _outside_strings(text, func):
+    parts = STRING.split(text)
+    return ''.join(part if i % 2 else func(part) for i, part in enumerate(parts))
+
+def _minify_value(text):
+    text = re.sub(r'\s*,\s*', ',', text)
+    text = re.sub(r'\s*!\s*important', '!important', text)
+    # 0.5 -> .5
+    return re.sub(r'(?<![\w.])0+(\.\d)', r'\1', text)
+
+def _minify_selector(text):
+    return re.sub(r'\s*([>+~,])\s*', r'\1', text)
+
+def _minify_block(text):
+    return re.sub(r'\s*([{};:,])\s*', r'\1', ' '.join(text.split())).replace(';}', '}')
+
+def minify_rule(rule):
+    """Serialize one rule with no optional whitespace"""
+    if isinstance(rule, StyleRule):
+        selectors = _outside_strings(','.join(rule.selectors), _minify_selector)
+        body = ';'.join(f"{name}:{_outside_strings(value, _minify_value)}" for name, value in rule.declarations)
+        return f"{selectors}{{{body}}}"
+    if rule.rules is not None:
+        return f"{rule.prelude}{{{minify(rule.rules)}}}"
+    if rule.block is not None:
+        return f"{rule.prelude}{{{_outside_strings(rule.block, _minify_block)}}}"
+    return f"{rule.prelude};"
+
+def minify(rules):
+    """Turn parsed rules back into minified CSS text"""
+    return ''.join(minify_rule(rule) for rule in rules)
+
+class SelectorMatcher:
+    """Compile selectors once and test them against page trees"""
+
+    def __init__(self):
+        self.translator = GenericTranslator()
+        self._compiled = {}
+
+    def compile(self, selector):
+        """XPath for a selector, or None when it cannot be evaluated statically"""
+        if selector not in self._compiled:
+            stripped = PSEUDO_ELEMENT.sub('', DYNAMIC_PSEUDO.sub('', selector)).strip() or '*'
+            try:
+                self._compiled[selector] = etree.XPath(self.translator.css_to_xpath(stripped))
+            except (SelectorError, etree.XPathError):
+                self._compiled[selector] = None
+        return self._compiled[selector]
+
+    def matches(self, selector, doc):
+        """True when the selector matches some element in doc (or cannot be checked)"""
+        xpath = self.compile(selector)
+        return xpath is None or bool(xpath(doc))
+
+    def select(self, selector, doc):
+        """Elements matching the selector, or None when it cannot be checked"""
+        xpath = self.compile(selector)
+        return None if xpath is None else xpath(doc)
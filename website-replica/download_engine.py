@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Concurrent Download Engine
+Bounded worker pool shared by the liquor image scrapers, with per-host
+concurrency caps, adaptive per-host rate limits with retry/backoff and a
+circuit breaker, plus a streaming constant-memory download path.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.parse import urlparse
+
+import requests
+
+from image_probe import PROBE_LIMIT, ProbeError, check_dimensions, probe_image
+from rate_limiter import (MAX_RETRY_AFTER, CircuitBreaker, CircuitOpenError, TokenBucket, backoff_delay,
+                          is_throttled, is_transient, retry_after)
+
+MAX_IMAGE_SIZE = 10 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+# Returned instead of True when the local copy was already current
+NOT_MODIFIED = "not-modified"
+
+class DownloadRejected(ValueError):
+    """Raised when a response is not an acceptable image; the message says why"""
+
+class DeadlineExceeded(RuntimeError):
+    """Raised when a transfer is still running at its caller's deadline"""
+
+def stream_download(session, url, filename, min_size=5000, max_size=MAX_IMAGE_SIZE, timeout=10, cache=None, blobs=None,
+                    min_dimensions=None, journal=None, deadline=None):
+    """Stream an image to disk through a temp file, rejecting bad responses early.
+
+    The first bytes are probed for a real JPEG/PNG/GIF/WebP header, so error
+    pages and undersized thumbnails are dropped before the rest is read; a
+    rejected response raises DownloadRejected. With a journal the body goes
+    to a stable .part file that outlives a dropped connection or a passed
+    deadline (a time.monotonic() value), and the next attempt requests only
+    the missing bytes.
+    """
+    filename = Path(filename)
+
+    headers = {}
+    entry = cache.lookup(url, filename) if cache else None
+    if entry is not None:
+        if cache.is_fresh(entry):
+            return NOT_MODIFIED
+        headers = cache.conditional_headers(entry)
+
+    part_path = journal.partial_path(filename) if journal else None
+    offset = 0
+    response = None
+    if part_path is not None and part_path.exists():
+        validator = journal.validator(url, filename)
+        if validator:
+            # If-Range makes the server send the whole image again if it changed
+            offset = part_path.stat().st_size
+            response = session.get(url, headers={'Range': f'bytes={offset}-', 'If-Range': validator},
+                                   timeout=timeout, stream=True)
+            if response.status_code == 200:
+                # The image changed or the server ignored the range: this is the whole image
+                offset = 0
+            elif not (response.status_code == 206 and response.headers.get(
+                    'content-range', '').startswith(f"bytes {offset}-")):
+                # Only a range starting at the .part offset can extend it; start over
+                response.close()
+                response = None
+                part_path.unlink(missing_ok=True)
+
+    if response is None:
+        offset = 0
+        response = session.get(url, headers=headers, timeout=timeout, stream=True)
+    resumed = offset > 0
+
+    with response:
+        if response.status_code == 304 and entry is not None:
+            cache.refresh(url, entry, response.headers)
+            return NOT_MODIFIED
+
+        response.raise_for_status()
+        if response.status_code == 206 and not resumed:
+            raise DownloadRejected("partial response to a full request")
+
+        # Check headers before reading any of the body
+        content_type = response.headers.get('content-type', '')
+        if not content_type.startswith('image/'):
+            raise DownloadRejected(f"not an image ({content_type or 'no content-type'})")
+
+        content_length = response.headers.get('content-length', '')
+        if content_length.isdigit():
+            if not min_size <= offset + int(content_length) <= max_size:
+                raise DownloadRejected(f"{offset + int(content_length):,} bytes, outside {min_size:,}-{max_size:,}")
+
+        if part_path is not None:
+            journal.start(url, filename, response.headers.get('etag') or response.headers.get('last-modified'))
+            tmp_path = part_path
+            f = open(part_path, 'ab' if resumed else 'wb')
+        else:
+            fd, tmp_path = tempfile.mkstemp(prefix=f".{filename.name}.", suffix=".part", dir=filename.parent)
+            f = os.fdopen(fd, 'wb')
+
+        keep_partial = False
+        try:
+            written = 0
+            hasher = hashlib.sha256()
+            head = b''
+            info = None
+
+            def accept(chunk):
+                """Hash and size-check a chunk, probing the header until it resolves"""
+                nonlocal written, head, info
+                written += len(chunk)
+                if written > max_size:
+                    raise DownloadRejected(f"larger than {max_size:,} bytes")
+                if info is None:
+                    head += chunk
+                    try:
+                        info = probe_image(head)
+                    except ProbeError as e:
+                        raise DownloadRejected(str(e)) from e
+                    if info is None and len(head) >= PROBE_LIMIT:
+                        raise DownloadRejected("no image header found")
+                    if info is not None:
+                        if not check_dimensions(info, min_dimensions):
+                            raise DownloadRejected(f"{info[1]}x{info[2]} is below {min_dimensions[0]}x{min_dimensions[1]}")
+                        head = None
+                hasher.update(chunk)
+
+            with f:
+                if resumed:
+                    with open(part_path, 'rb') as existing:
+                        for chunk in iter(lambda: existing.read(CHUNK_SIZE), b''):
+                            accept(chunk)
+
+                try:
+                    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                        accept(chunk)
+                        f.write(chunk)
+                        if deadline is not None and time.monotonic() > deadline:
+                            raise DeadlineExceeded(f"deadline passed after {written:,} bytes")
+                except (requests.RequestException, DeadlineExceeded):
+                    # Keep what arrived; the retry resumes from here
+                    keep_partial = part_path is not None
+                    raise
+
+            if written < min_size:
+                raise DownloadRejected(f"{written:,} bytes, below {min_size:,}")
+            if info is None:
+                raise DownloadRejected("no image header found")
+
+            if blobs:
+                # Store the payload once and hardlink it into place
+                blobs.commit(tmp_path, hasher.hexdigest(), filename)
+            else:
+                # mkstemp files are private; match a normal open() before publishing
+                os.chmod(tmp_path, 0o644)
+
+                # Atomic rename so readers never see a partial file
+                os.replace(tmp_path, filename)
+            tmp_path = None
+
+            if cache:
+                cache.store(url, filename, response.headers)
+            return True
+
+        finally:
+            if tmp_path is not None and not keep_partial:
+                try:
+                    os.unlink(tmp_path)
+                except FileNotFoundError:
+                    pass
+
+class DownloadEngine:
+    def __init__(self, max_workers=8, per_host=2, rate=2.0, max_rate=10.0, retries=3):
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.rate = rate
+        self.max_rate = max_rate
+        self.retries = retries
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="download")
+
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    def _host(self, url):
+        """Get (slots, bucket, breaker) for a URL's host"""
+        host = urlparse(url).netloc
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                state = (threading.BoundedSemaphore(self.per_host),
+                         TokenBucket(self.rate, burst=self.per_host, max_rate=self.max_rate),
+                         CircuitBreaker())
+                self._hosts[host] = state
+            return state
+
+    @contextmanager
+    def polite(self, url):
+        """Hold a per-host slot and wait for the host's rate limit around a request"""
+        slots, bucket, _ = self._host(url)
+
+        with slots:
+            bucket.acquire()
+            yield
+
+    def call(self, func, url, *args, **kwargs):
+        """Run func(url, ...) politely, retrying throttled and transient failures.
+
+        Raises CircuitOpenError without sending anything once the host has
+        failed too often in a row.
+        """
+        _, bucket, breaker = self._host(url)
+        host = urlparse(url).netloc
+
+        for attempt in range(self.retries + 1):
+            if not breaker.allow():
+                raise CircuitOpenError(f"{host} is failing, skipping requests for now")
+
+            try:
+                with self.polite(url):
+                    result = func(url, *args, **kwargs)
+            except Exception as e:
+                if not is_transient(e):
+                    # The host answered; it is the request that was bad
+                    breaker.record_success()
+                    raise
+
+                breaker.record_failure()
+                wait = retry_after(e)
+                if wait is not None or is_throttled(e):
+                    bucket.slow_down()
+                if wait is not None and wait > MAX_RETRY_AFTER:
+                    breaker.trip()
+                    raise
+                if attempt == self.retries:
+                    raise
+
+                if wait is None:
+                    wait = backoff_delay(attempt)
+                else:
+                    # Everyone else waiting on this host holds off too
+                    bucket.pause(wait)
+                print(f"⚠️ {host}: {e}; retrying in {wait:.1f}s")
+                time.sleep(wait)
+            else:
+                breaker.record_success()
+                bucket.speed_up()
+                return result
+
+    def fetch(self, session, url, **kwargs):
+        """GET a page through call(), raising for error statuses"""
+        def get(url):
+            response = session.get(url, **kwargs)
+            response.raise_for_status()
+            return response
+
+        return self.call(get, url)
+
+    def submit(self, func, url, *args, **kwargs):
+        """Schedule func(url, *args, **kwargs) on the worker pool.
+
+        func is expected to send its requests through call() or polite().
+        """
+        return self.executor.submit(func, url, *args, **kwargs)
+
+    def download_all(self, download_func, jobs):
+        """Run (url, filename, min_size) jobs concurrently and count successes"""
+        futures = [
+            self.submit(download_func, url, filename, min_size)
+            for url, filename, min_size in jobs
+        ]
+
+        success_count = 0
+        for future in as_completed(futures):
+            try:
+                if future.result():
+                    success_count += 1
+            except Exception:
+                # download_func has already reported the failure
+                pass
+
+        return success_count
+
+    def shutdown(self):
+        """Wait for queued downloads and stop the worker threads"""
+        self.executor.shutdown(wait=True)
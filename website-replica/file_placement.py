@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Zero-Copy File Placement
+Places an image at a destination path using the cheapest mechanism the
+filesystem supports: hardlink, reflink (FICLONE), copy_file_range, and
+finally shutil.copyfile (sendfile on Linux, chunked copy elsewhere). Also
+holds the atomic write and SHA-256 file hash the other scripts share.
+"""
+
+import errno
+import filecmp
+import hashlib
+import os
+import shutil
+import threading
+from pathlib import Path
+
+# FICLONE from <linux/fs.h>; shares extents on btrfs/XFS/bcachefs
+FICLONE = 0x40049409
+
+# Errors meaning "this mechanism is not available here", not real failures
+UNSUPPORTED = {errno.EXDEV, errno.EPERM, errno.EINVAL, errno.ENOSYS,
+               errno.EOPNOTSUPP, errno.ENOTSUP, errno.ENOTTY, errno.EMLINK}
+
+def file_digest(path):
+    """SHA-256 of a file, read in 1 MB chunks"""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def atomic_write(path, data):
+    """Write a file via a temp file and rename, so readers never see half of it"""
+    path = Path(path)
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def _same_file(src, dst):
+    try:
+        return os.path.samefile(src, dst)
+    except OSError:
+        return False
+
+def _identical(src, dst):
+    try:
+        if os.stat(src).st_size != os.stat(dst).st_size:
+            return False
+        return filecmp.cmp(src, dst, shallow=False)
+    except OSError:
+        return False
+
+def _reflink(src, tmp_path):
+    import fcntl
+
+    with open(src, 'rb') as fsrc, open(tmp_path, 'wb') as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+def _copy_file_range(src, tmp_path):
+    with open(src, 'rb') as fsrc, open(tmp_path, 'wb') as fdst:
+        remaining = os.fstat(fsrc.fileno()).st_size
+        while remaining > 0:
+            copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+            if copied == 0:
+                break
+            remaining -= copied
+
+def place_file(src, dst, hardlink=True):
+    """Place src at dst atomically and return the mechanism that was used"""
+    src, dst = Path(src), Path(dst)
+
+    if _same_file(src, dst):
+        return "same"
+
+    tmp_path = dst.with_name(f".{dst.name}.{threading.get_ident()}.place")
+    try:
+        if hardlink:
+            try:
+                os.link(src, tmp_path)
+                os.replace(tmp_path, dst)
+                return "hardlink"
+            except OSError as e:
+                if e.errno not in UNSUPPORTED:
+                    raise
+
+        # Anything past this point moves bytes, so skip it when nothing would change
+        if _identical(src, dst):
+            return "identical"
+
+        strategies = [("reflink", _reflink)]
+        if hasattr(os, 'copy_file_range'):
+            strategies.append(("copy_file_range", _copy_file_range))
+
+        for name, strategy in strategies:
+            try:
+                strategy(src, tmp_path)
+                os.replace(tmp_path, dst)
+                return name
+            except (OSError, ImportError) as e:
+                if isinstance(e, OSError) and e.errno not in UNSUPPORTED:
+                    raise
+
+        # Uses os.sendfile on Linux and a chunked copy elsewhere
+        shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, dst)
+        return "copy"
+
+    finally:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
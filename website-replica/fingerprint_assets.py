@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Static Asset Fingerprinting
+Publishes the replica pages into a build directory with every referenced
+stylesheet, script and image renamed to a content-hash name, rewrites all
+href/src/url() references in one pass, and writes an asset manifest plus
+long-lived cache headers for the CDN. A stylesheet is published from the
+.min.css that css_optimizer.py wrote next to it, when that is up to date.
+
+Build stages run in this order, the last three working in place on dist/:
+    css_optimizer.py → fingerprint_assets.py → critical_css.py → html_minifier.py
+    → precompress.py --root dist
+"""
+
+import argparse
+import hashlib
+import json
+import posixpath
+import re
+from pathlib import Path
+from urllib.parse import unquote
+
+from file_placement import atomic_write, file_digest, place_file
+
+# Extensions that get fingerprinted; pages keep their stable names
+ASSET_EXTENSIONS = {
+    ".css", ".js", ".jpg", ".jpeg", ".png", ".gif", ".webp", ".avif", ".svg",
+    ".ico", ".woff", ".woff2",
+}
+
+# href="..." / src="..." attributes and CSS url(...) values (the old updater
+# also wrote url(\'...\') with escaped quotes, so those are accepted too)
+REFERENCE = re.compile(
+    r'''(?P<attr>\b(?:href|src)=)(?P<quote>["'])(?P<url>[^"']*)(?P=quote)'''
+    r'''|url\(\s*(?P<cquote>\\?["']?)(?P<curl>[^"')\\]+)(?P=cquote)\s*\)'''
+)
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+def optimized_source(source):
+    """The css_optimizer.py output for a stylesheet, if it is newer than the stylesheet"""
+    optimized = source.with_name(f"{source.stem}.min{source.suffix}")
+    if not optimized.is_file():
+        return source
+    if optimized.stat().st_mtime_ns < source.stat().st_mtime_ns:
+        print(f"⚠️ {optimized.name} is older than {source.name}; re-run css_optimizer.py. Publishing the source")
+        return source
+    return optimized
+
+class AssetFingerprinter:
+    def __init__(self, site_dir=".", output_dir="dist", hash_length=10):
+        self.site_dir = Path(site_dir).resolve()
+        self.output_dir = Path(output_dir)
+        self.hash_length = hash_length
+
+        # original path -> hashed path, both relative to the site root
+        self.manifest = {}
+
+    def _hashed_name(self, rel_path, digest):
+        stem, ext = posixpath.splitext(rel_path)
+        return f"{stem}.{digest[:self.hash_length]}{ext}"
+
+    def _resolve(self, url, base_dir):
+        """Map a reference to a site-relative asset path, or None to leave it alone"""
+        if not url or url.startswith(('#', '/', 'data:', 'mailto:', 'tel:', 'javascript:')) or '://' in url:
+            return None
+
+        path = re.split(r'[?#]', url, maxsplit=1)[0]
+        if posixpath.splitext(path)[1].lower() not in ASSET_EXTENSIONS:
+            return None
+
+        rel_path = posixpath.normpath(posixpath.join(base_dir, unquote(path)))
+        if rel_path.startswith('..') or not (self.site_dir / rel_path).is_file():
+            return None
+        return rel_path
+
+    def _rewrite(self, content, base_dir):
+        """Rewrite every asset reference in HTML or CSS text in a single pass"""
+        def replace(match):
+            url = match.group('url') if match.group('attr') else match.group('curl')
+            rel_path = self._resolve(url, base_dir)
+            if rel_path is None:
+                return match.group(0)
+
+            hashed = self._fingerprint(rel_path)
+            new_url = url.replace(posixpath.basename(rel_path), posixpath.basename(hashed), 1)
+
+            if match.group('attr'):
+                quote = match.group('quote')
+                return f"{match.group('attr')}{quote}{new_url}{quote}"
+            return f"url({match.group('cquote')}{new_url}{match.group('cquote')})"
+
+        return REFERENCE.sub(replace, content)
+
+    def _fingerprint(self, rel_path):
+        """Publish one asset under its content-hash name and return that name"""
+        if rel_path in self.manifest:
+            return self.manifest[rel_path]
+
+        source = self.site_dir / rel_path
+        # Reserve the entry so a stylesheet that references itself cannot recurse forever
+        self.manifest[rel_path] = rel_path
+
+        if rel_path.endswith('.css'):
+            # Stylesheets are hashed after their own url() references are rewritten
+            with open(optimized_source(source), 'r', encoding='utf-8') as f:
+                css = self._rewrite(f.read(), posixpath.dirname(rel_path)).encode('utf-8')
+            hashed = self._hashed_name(rel_path, hashlib.sha256(css).hexdigest())
+            target = self.output_dir / hashed
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if not target.exists():
+                atomic_write(target, css)
+        else:
+            hashed = self._hashed_name(rel_path, file_digest(source))
+            target = self.output_dir / hashed
+            target.parent.mkdir(parents=True, exist_ok=True)
+            place_file(source, target)
+
+        self.manifest[rel_path] = hashed
+        return hashed
+
+    def build(self):
+        """Fingerprint every asset referenced by the pages and publish the pages"""
+        print("🔖 Fingerprinting static assets...")
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+        pages = sorted(self.site_dir.glob("*.html"))
+        for page in pages:
+            with open(page, 'r', encoding='utf-8') as f:
+                content = self._rewrite(f.read(), "")
+            atomic_write(self.output_dir / page.name, content.encode('utf-8'))
+
+        manifest = dict(sorted(self.manifest.items()))
+        atomic_write(self.output_dir / "asset-manifest.json",
+                     (json.dumps(manifest, indent=2) + "\n").encode('utf-8'))
+        atomic_write(self.output_dir / "_headers", self._headers(manifest).encode('utf-8'))
+
+        print(f"✓ {len(manifest)} assets fingerprinted across {len(pages)} pages")
+        print(f"📁 Output written to: {self.output_dir}")
+        return manifest
+
+    def _headers(self, manifest):
+        """Cache rules: hashed assets never change, pages always revalidate"""
+        lines = ["/*.html", f"  Cache-Control: {REVALIDATE}", "/", f"  Cache-Control: {REVALIDATE}"]
+        for hashed in manifest.values():
+            lines.extend([f"/{hashed}", f"  Cache-Control: {IMMUTABLE}"])
+        return "\n".join(lines) + "\n"
+
+def main():
+    parser = argparse.ArgumentParser(description='Fingerprint static assets for immutable caching')
+    parser.add_argument('--site', '-s', default='.', help='Directory containing the pages')
+    parser.add_argument('--output', '-o', default='dist', help='Build output directory')
+
+    args = parser.parse_args()
+
+    AssetFingerprinter(args.site, args.output).build()
+
+if __name__ == "__main__":
+    main()
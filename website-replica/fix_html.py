@@ -6,6 +6,8 @@ Fix the malformed HTML from the image update process
 import os
 from pathlib import Path
 
+from update_html_images import HTMLImageUpdater, PAGE_RULES
+
 def fix_index_html():
     """Fix the malformed index.html file"""
     file_path = Path("index.html")
@@ -14,114 +16,9 @@ def fix_index_html():
         print("❌ index.html not found")
         return False
 
-    with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-
-    # Fix the malformed product cards
-    # Remove the duplicate product-image divs and fix the structure
-
-    # Pattern to fix the first product card
-    pattern1 = r'''                        <div class="product-image">
-                            <svg class="icon" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
-                                <path d="M7 2h10c1\.1 0 2 \.9 2 2v1c0 1\.1-\.9 2-2 2H7c-1\.1 0-2-\.9-2-2V4c0-1\.1\.9-2 2-2z"/>
-                                <path d="M7 6v14c0 1\.1\.9 2 2 2h6c1\.1 0 2-\.9 2-2V6"/>
-                                <path d="M11 10v8"/>
-                                <path d="M9 12v6"/>
-                                <path d="M13 8v8"/>
-                            </svg>
-                        </div>
-                        <h3 class="product-title">Whisky Macallan 18 Años</h3>
-                <div class="product-image" style="background-image: url\('images/products/macallan_18\.jpg'\); background-size: cover; background-position: center;">'''
-
-    replacement1 = '''                        <div class="product-image" style="background-image: url('images/products/macallan_18.jpg'); background-size: cover; background-position: center;">
-                            <svg class="icon" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
-                                <path d="M7 2h10c1.1 0 2 .9 2 2v1c0 1.1-.9 2-2 2H7c-1.1 0-2-.9-2-2V4c0-1.1.9-2 2-2z"/>
-                                <path d="M7 6v14c0 1.1.9 2 2 2h6c1.1 0 2-.9 2-2V6"/>
-                                <path d="M11 10v8"/>
-                                <path d="M9 12v6"/>
-                                <path d="M13 8v8"/>
-                            </svg>
-                        </div>
-                        <h3 class="product-title">Whisky Macallan 18 Años</h3>'''
-
-    content = content.replace(pattern1, replacement1)
-
-    # Fix second product card
-    pattern2 = r'''                        <div class="product-image">
-                            <svg class="icon" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
-                                <path d="M6 2 3 6v14c0 1\.1\.9 2 2 2h4c1\.1 0 2-\.9 2-2V6l-3-4z"/>
-                                <path d="M6 2v4"/>
-                                <path d="M6 10v4"/>
-                                <path d="M6 18v2"/>
-                                <path d="M21 15V6l-3-4-3 4v9"/>
-                            </svg>
-                        </div>
-                        <h3 class="product-title">Vino Cabernet Sauvignon</h3>
-                <div class="product-image" style="background-image: url\('images/products/cabernet_sauvignon\.jpg'\); background-size: cover; background-position: center;">'''
-
-    replacement2 = '''                        <div class="product-image" style="background-image: url('images/products/cabernet_sauvignon.jpg'); background-size: cover; background-position: center;">
-                            <svg class="icon" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
-                                <path d="M6 2 3 6v14c0 1.1.9 2 2 2h4c1.1 0 2-.9 2-2V6l-3-4z"/>
-                                <path d="M6 2v4"/>
-                                <path d="M6 10v4"/>
-                                <path d="M6 18v2"/>
-                                <path d="M21 15V6l-3-4-3 4v9"/>
-                            </svg>
-                        </div>
-                        <h3 class="product-title">Vino Cabernet Sauvignon</h3>'''
-
-    content = content.replace(pattern2, replacement2)
-
-    # Fix third product card
-    pattern3 = r'''                        <div class="product-image">
-                            <svg class="icon" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
-                                <path d="M5 8h14M5 8c0-1\.7 1\.3-3 3-3h8c1\.7 0 3 1\.3 3 3v8c0 1\.7-1\.3 3-3 3H8c-1\.7 0-3-1\.3-3-3V8z"/>
-                                <path d="M12 12v4"/>
-                                <path d="M9 12v4"/>
-                                <path d="M15 12v4"/>
-                            </svg>
-                        </div>
-                        <h3 class="product-title">Coñac Hennessy VSOP</h3>
-                <div class="product-image" style="background-image: url\('images/products/hennessy_vsop\.jpg'\); background-size: cover; background-position: center;">'''
-
-    replacement3 = '''                        <div class="product-image" style="background-image: url('images/products/hennessy_vsop.jpg'); background-size: cover; background-position: center;">
-                            <svg class="icon" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
-                                <path d="M5 8h14M5 8c0-1.7 1.3-3 3-3h8c1.7 0 3 1.3 3 3v8c0 1.7-1.3 3-3 3H8c-1.7 0-3-1.3-3-3V8z"/>
-                                <path d="M12 12v4"/>
-                                <path d="M9 12v4"/>
-                                <path d="M15 12v4"/>
-                            </svg>
-                        </div>
-                        <h3 class="product-title">Coñac Hennessy VSOP</h3>'''
-
-    content = content.replace(pattern3, replacement3)
-
-    # Fix fourth product card
-    pattern4 = r'''                        <div class="product-image">
-                            <svg class="icon" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
-                                <path d="M3 2v20h18"/>
-                                <path d="M8 11V7"/>
-                                <path d="M12 18V9"/>
-                                <path d="M16 16V5"/>
-                            </svg>
-                        </div>
-                        <h3 class="product-title">Ron Zacapa 23</h3>
-                <div class="product-image" style="background-image: url\('images/products/zacapa_23\.jpg'\); background-size: cover; background-position: center;">'''
-
-    replacement4 = '''                        <div class="product-image" style="background-image: url('images/products/zacapa_23.jpg'); background-size: cover; background-position: center;">
-                            <svg class="icon" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
-                                <path d="M3 2v20h18"/>
-                                <path d="M8 11V7"/>
-                                <path d="M12 18V9"/>
-                                <path d="M16 16V5"/>
-                            </svg>
-                        </div>
-                        <h3 class="product-title">Ron Zacapa 23</h3>'''
-
-    content = content.replace(pattern4, replacement4)
-
-    with open(file_path, 'w', encoding='utf-8') as f:
-        f.write(content)
+    # The DOM rewriter drops the duplicate product-image divs left by the old
+    # regex updater and sets each image on the card's own image element
+    HTMLImageUpdater().rewrite_page("index.html")
 
     print("✓ Fixed index.html structure")
     return True
@@ -129,24 +26,15 @@ def fix_index_html():
 def fix_other_pages():
     """Fix the structure in other pages too"""
     pages = ['productos.html', 'carrito.html', 'checkout.html']
+    updater = HTMLImageUpdater()
+
+    # Pages are rewritten in parallel, each loaded and written once
+    counts = updater.rewrite_pages((page, PAGE_RULES[page]) for page in pages)
 
     for page in pages:
-        page_path = Path(page)
-        if not page_path.exists():
+        if counts[page] is None:
             continue
 
-        with open(page_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-
-        # Fix similar patterns in other pages
-        content = content.replace(
-            '<div class="product-image">\n                            <svg class="icon"',
-            '<div class="product-image" style="background-image: url(\'images/products/macallan_18.jpg\'); background-size: cover; background-position: center;">\n                            <svg class="icon"'
-        )
-
-        with open(page_path, 'w', encoding='utf-8') as f:
-            f.write(content)
-
         print(f"✓ Fixed {page}")
 
     return True
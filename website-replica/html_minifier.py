@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+HTML Minifier
+Output stage for the replica pages: hoists inline styles repeated within a
+page into generated classes, strips comments and insignificant whitespace,
+minifies inline <style> blocks and shortens SVG path data.
+
+Runs in place on the dist/ build that fingerprint_assets.py publishes and
+critical_css.py inlines into, so the pages it minifies already point at the
+hashed assets; precompress.py runs last.
+"""
+
+import argparse
+import re
+from pathlib import Path
+
+import lxml.html
+from lxml import etree
+
+from css_rules import minify, parse_declarations, parse_stylesheet
+from update_html_images import parse_page, serialize_page, write_if_changed
+
+# Whitespace between these elements never renders
+BLOCK_TAGS = {
+    "html", "head", "body", "title", "meta", "link", "style", "script", "noscript",
+    "header", "footer", "main", "nav", "section", "article", "aside", "div", "form",
+    "fieldset", "h1", "h2", "h3", "h4", "h5", "h6", "p", "ul", "ol", "li", "dl", "dt",
+    "dd", "table", "thead", "tbody", "tfoot", "tr", "td", "th", "hr", "br", "option",
+    "select", "path", "g", "circle", "rect", "line", "polyline", "polygon", "defs",
+    "lineargradient", "stop",
+}
+
+# Content of these is copied through verbatim
+PRESERVE_TAGS = {"pre", "textarea", "script"}
+
+# A declaration set must repeat this often on a page to earn a class
+HOIST_MIN_COUNT = 2
+HOIST_CLASS_PREFIX = "s-"
+
+# Decimal places kept in SVG coordinates
+SVG_PRECISION = 3
+
+SVG_NUMBER = re.compile(r'[A-Za-z]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+
+# element.style.fooBar = ... in page scripts
+SCRIPT_STYLE_PROPERTY = re.compile(r'\.style\.([a-zA-Z]+)')
+
+def format_number(token):
+    """Shortest spelling of a coordinate at SVG_PRECISION"""
+    value = round(float(token), SVG_PRECISION)
+    text = f"{value:.{SVG_PRECISION}f}".rstrip('0').rstrip('.')
+    if text in ('-0', ''):
+        return '0'
+    if text.startswith('0.'):
+        return text[1:]
+    if text.startswith('-0.'):
+        return '-' + text[2:]
+    return text
+
+def shrink_path(data):
+    """Round path coordinates and drop every separator the grammar allows"""
+    out = []
+    previous = None
+    for token in SVG_NUMBER.findall(data):
+        if token.isalpha():
+            out.append(token)
+            previous = None
+            continue
+
+        number = format_number(token)
+        # A separator is only needed when the next number could merge with the last
+        if previous is not None and not number.startswith('-') and not (
+                number.startswith('.') and '.' in previous):
+            out.append(' ')
+        out.append(number)
+        previous = number
+    return ''.join(out)
+
+def _camel_to_kebab(name):
+    return re.sub(r'[A-Z]', lambda m: '-' + m.group(0).lower(), name)
+
+class HTMLMinifier:
+    def __init__(self, site_dir="dist", output_dir=None):
+        self.site_dir = Path(site_dir)
+        self.output_dir = Path(output_dir) if output_dir else self.site_dir
+
+    def _script_properties(self, doc):
+        """CSS properties page scripts set inline; those declarations must stay inline"""
+        properties = set()
+        for script in doc.iter('script'):
+            source = script.text or ''
+            src = script.get('src')
+            if src and (self.site_dir / src).is_file():
+                with open(self.site_dir / src, 'r', encoding='utf-8') as f:
+                    source += f.read()
+            properties.update(_camel_to_kebab(name) for name in SCRIPT_STYLE_PROPERTY.findall(source))
+        return properties
+
+    def hoist_styles(self, doc):
+        """Move inline declaration sets repeated on the page into generated classes"""
+        pinned = self._script_properties(doc)
+
+        candidates = []
+        counts = {}
+        for el in doc.iter():
+            if not isinstance(el.tag, str) or not el.get('style'):
+                continue
+
+            declarations = parse_declarations(el.get('style'))
+            # Per-image urls stay inline (the preloader reads them), as do script-driven properties
+            inline = [i for i, (name, value) in enumerate(declarations) if name in pinned or 'url(' in value]
+            # ...and so does anything a later inline shorthand/longhand of the same family overrides
+            hoistable = tuple(
+                (name, value) for i, (name, value) in enumerate(declarations)
+                if i not in inline and not any(
+                    j > i and declarations[j][0].split('-')[0] == name.split('-')[0] for j in inline)
+            )
+            if hoistable:
+                candidates.append((el, declarations, hoistable))
+                counts[hoistable] = counts.get(hoistable, 0) + 1
+
+        classes = {}
+        for el, declarations, hoistable in candidates:
+            if counts[hoistable] < HOIST_MIN_COUNT:
+                continue
+            if hoistable not in classes:
+                classes[hoistable] = f"{HOIST_CLASS_PREFIX}{len(classes)}"
+
+            el.set('class', f"{el.get('class', '')} {classes[hoistable]}".strip())
+            remaining = [d for d in declarations if d not in hoistable]
+            if remaining:
+                el.set('style', ';'.join(f"{name}:{value}" for name, value in remaining))
+            else:
+                del el.attrib['style']
+
+        if classes:
+            rules = []
+            for hoistable, name in classes.items():
+                # !important keeps the precedence the declarations had as inline styles
+                body = ';'.join(f"{prop}:{value}" if value.endswith('!important') else f"{prop}:{value} !important"
+                                for prop, value in hoistable)
+                rules.append(f".{name}{{{body}}}")
+            css = ''.join(rules)
+            style = lxml.html.Element('style')
+            style.text = minify(parse_stylesheet(css))
+            doc.head.append(style)
+
+        return len(classes)
+
+    def _strip(self, el):
+        """Drop comments and collapse whitespace below el"""
+        for child in list(el):
+            if child.tag is etree.Comment and not (child.text or '').startswith('[if'):
+                child.drop_tree()
+
+        if el.tag in PRESERVE_TAGS:
+            return
+        if el.tag == 'style':
+            el.text = minify(parse_stylesheet(el.text or ''))
+            return
+
+        children = [child for child in el if isinstance(child.tag, str)]
+        if el.text is not None:
+            el.text = self._collapse(el.text, el.tag in BLOCK_TAGS,
+                                     children[0].tag in BLOCK_TAGS if children else el.tag in BLOCK_TAGS)
+        for index, child in enumerate(children):
+            self._strip(child)
+            if child.tail is not None:
+                after = children[index + 1].tag in BLOCK_TAGS if index + 1 < len(children) else el.tag in BLOCK_TAGS
+                child.tail = self._collapse(child.tail, child.tag in BLOCK_TAGS, after)
+
+        if el.tag in ('path', 'polyline', 'polygon'):
+            for attr in ('d', 'points'):
+                if el.get(attr):
+                    el.set(attr, shrink_path(el.get(attr)))
+
+    def _collapse(self, text, block_before, block_after):
+        """Collapse a whitespace run; drop it entirely between two block boundaries"""
+        collapsed = re.sub(r'\s+', ' ', text)
+        if block_before:
+            collapsed = collapsed.lstrip(' ')
+        if block_after:
+            collapsed = collapsed.rstrip(' ')
+        return collapsed or None
+
+    def minify_page(self, page):
+        """Minify one page into the output directory; returns (before, after) sizes"""
+        with open(page, 'r', encoding='utf-8') as f:
+            source = f.read()
+
+        doc = parse_page(source)
+        hoisted = self.hoist_styles(doc)
+        self._strip(doc)
+
+        output = serialize_page(doc)
+        write_if_changed(self.output_dir / page.name, output)
+
+        before, after = len(source.encode('utf-8')), len(output.encode('utf-8'))
+        print(f"✓ {page.name}: {before:,} → {after:,} bytes, {hoisted} style classes")
+        return before, after
+
+    def minify_all(self):
+        """Minify every page in the site directory"""
+        print("🗜️ Minifying HTML pages...")
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+        total_before = total_after = 0
+        for page in sorted(self.site_dir.glob("*.html")):
+            try:
+                before, after = self.minify_page(page)
+                total_before += before
+                total_after += after
+            except Exception as e:
+                print(f"✗ Failed to minify {page.name}: {e}")
+
+        if total_before:
+            print(f"✅ {total_before:,} → {total_after:,} bytes ({100 * total_after / total_before:.1f}%)")
+        print(f"📁 Output written to: {self.output_dir}")
+        return total_before - total_after
+
+def main():
+    parser = argparse.ArgumentParser(description='Minify the replica HTML pages')
+    parser.add_argument('--site', '-s', default='dist', help='Directory containing the pages (the fingerprinted build)')
+    parser.add_argument('--output', '-o', default=None, help='Output directory (default: minify in place)')
+
+    args = parser.parse_args()
+
+    HTMLMinifier(args.site, args.output).minify_all()
+
+if __name__ == "__main__":
+    main()
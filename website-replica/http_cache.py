@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Persistent HTTP Cache
+Stores ETag/Last-Modified validators per URL so scraper re-runs can send
+conditional requests and skip unchanged images entirely.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+
+class HTTPCache:
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _entry_path(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _load(self, url):
+        try:
+            with open(self._entry_path(url), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save(self, url, entry):
+        path = self._entry_path(url)
+        path.parent.mkdir(exist_ok=True)
+
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    def lookup(self, url, filename):
+        """Get the cache entry for a URL if filename still holds its payload"""
+        entry = self._load(url)
+        if entry is None:
+            return None
+
+        recorded = entry.get("paths", {}).get(str(filename))
+        if recorded is None:
+            return None
+
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return None
+
+        if [stat.st_size, stat.st_mtime_ns] != recorded:
+            return None
+
+        return entry
+
+    def is_fresh(self, entry):
+        """Check whether an entry can be reused without revalidation"""
+        return entry.get("expires", 0) > time.time()
+
+    def conditional_headers(self, entry):
+        """Build If-None-Match / If-Modified-Since headers for an entry"""
+        headers = {}
+        if entry.get("etag"):
+            headers['If-None-Match'] = entry["etag"]
+        if entry.get("last_modified"):
+            headers['If-Modified-Since'] = entry["last_modified"]
+        return headers
+
+    def store(self, url, filename, response_headers):
+        """Record validators after filename was written from a 200 response"""
+        stat = os.stat(filename)
+        etag = response_headers.get('etag')
+        last_modified = response_headers.get('last-modified')
+
+        with self._lock:
+            entry = self._load(url) or {}
+
+            # A different payload upstream invalidates the other local copies
+            paths = entry.get("paths", {})
+            if entry.get("etag") != etag or entry.get("last_modified") != last_modified:
+                paths = {}
+            paths[str(filename)] = [stat.st_size, stat.st_mtime_ns]
+
+            self._save(url, {
+                "url": url,
+                "etag": etag,
+                "last_modified": last_modified,
+                "expires": self._expires(response_headers),
+                "paths": paths
+            })
+
+    def refresh(self, url, entry, response_headers):
+        """Extend an entry's freshness after a 304 Not Modified"""
+        with self._lock:
+            entry = dict(entry)
+            entry["expires"] = self._expires(response_headers)
+            if response_headers.get('etag'):
+                entry["etag"] = response_headers['etag']
+            self._save(url, entry)
+
+    def _expires(self, response_headers):
+        """Work out when a response stops being fresh"""
+        cache_control = response_headers.get('cache-control', '')
+        if re.search(r'no-cache|no-store', cache_control):
+            return 0
+
+        match = re.search(r'max-age=(\d+)', cache_control)
+        if match:
+            return time.time() + int(match.group(1))
+
+        expires = response_headers.get('expires')
+        if expires:
+            try:
+                return parsedate_to_datetime(expires).timestamp()
+            except (TypeError, ValueError):
+                return 0
+
+        return 0
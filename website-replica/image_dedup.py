@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Perceptual Near-Duplicate Detection
+Hashes every image in the manifest with aHash/dHash/pHash (vectorised with
+NumPy), finds near-duplicates with a BK-tree instead of comparing every
+pair, and writes a report. With --alias, near-identical copies are replaced
+by hardlinks to the best copy so the browser caches one shared file.
+"""
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from blob_store import BlobStore
+from image_manifest import ImageManifest
+
+# Thumbnail side the DCT is taken over; pHash keeps its low 8x8 frequencies
+DCT_SIZE = 32
+HASH_SIZE = 8
+
+# Hamming distance (of 64 bits) under which two pHashes count as near-duplicates
+NEAR_DISTANCE = 8
+# Stricter bounds for --alias, which replaces files: the copies must also
+# share an aspect ratio, or a crop would be swapped for a different framing
+ALIAS_DISTANCE = 2
+ALIAS_ASPECT_TOLERANCE = 0.02
+
+def _dct_matrix(n):
+    k = np.arange(n)
+    matrix = np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n))
+    matrix[0] /= np.sqrt(2)
+    return matrix * np.sqrt(2 / n)
+
+DCT = _dct_matrix(DCT_SIZE)
+
+def load_gray(path):
+    """Decode an image to a DCT_SIZE x DCT_SIZE grayscale array (worker process)"""
+    with Image.open(path) as img:
+        # JPEG decodes at 1/8 scale when that is still larger than the thumbnail
+        img.draft('L', (DCT_SIZE * 2, DCT_SIZE * 2))
+        img = ImageOps.exif_transpose(img).convert('L')
+        thumb = img.resize((DCT_SIZE, DCT_SIZE), Image.Resampling.LANCZOS)
+    return np.asarray(thumb, dtype=np.float32)
+
+def _pack(bits):
+    """Pack an (N, 64) boolean array into N Python ints"""
+    packed = np.packbits(bits.astype(np.uint8), axis=1)
+    return [int.from_bytes(row.tobytes(), 'big') for row in packed]
+
+def perceptual_hashes(stack):
+    """aHash, dHash and pHash for a stack of (N, 32, 32) grayscale thumbnails"""
+    n = stack.shape[0]
+
+    # Block-average 32x32 down to 8x8 (and 9 columns for the gradient hash)
+    small = stack.reshape(n, HASH_SIZE, DCT_SIZE // HASH_SIZE, HASH_SIZE, DCT_SIZE // HASH_SIZE).mean(axis=(2, 4))
+    ahash = small > small.mean(axis=(1, 2), keepdims=True)
+
+    columns = np.linspace(0, DCT_SIZE - 1, HASH_SIZE + 1).round().astype(int)
+    rows = stack.reshape(n, HASH_SIZE, DCT_SIZE // HASH_SIZE, DCT_SIZE).mean(axis=2)[:, :, columns]
+    dhash = rows[:, :, 1:] > rows[:, :, :-1]
+
+    # Separable 2-D DCT for all images at once: D @ X @ D.T
+    freq = np.einsum('ij,njk,lk->nil', DCT, stack, DCT)[:, :HASH_SIZE, :HASH_SIZE].reshape(n, -1)
+    # The DC term only encodes brightness; compare the rest to their median
+    phash = freq > np.median(freq[:, 1:], axis=1, keepdims=True)
+
+    return (_pack(ahash.reshape(n, -1)), _pack(dhash.reshape(n, -1)), _pack(phash))
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+class BKTree:
+    """Burkhard-Keller tree over Hamming distance for radius queries"""
+
+    def __init__(self):
+        self.root = None
+
+    def add(self, key, value):
+        node = [key, [value], {}]
+        if self.root is None:
+            self.root = node
+            return
+
+        current = self.root
+        while True:
+            distance = hamming(key, current[0])
+            if distance == 0:
+                current[1].append(value)
+                return
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def search(self, key, radius):
+        """Yield (distance, value) for every stored key within radius"""
+        stack = [self.root] if self.root else []
+        while stack:
+            node_key, values, children = stack.pop()
+            distance = hamming(key, node_key)
+            if distance <= radius:
+                for value in values:
+                    yield distance, value
+            # Triangle inequality: only subtrees in [d - r, d + r] can hold matches
+            for edge, child in children.items():
+                if distance - radius <= edge <= distance + radius:
+                    stack.append(child)
+
+class ImageDeduplicator:
+    def __init__(self, images_dir="images", distance=NEAR_DISTANCE, max_workers=None):
+        self.images_dir = Path(images_dir)
+        self.cache_file = self.images_dir / ".phash_cache.json"
+        self.report_file = self.images_dir / "duplicates.json"
+        self.distance = distance
+        self.max_workers = max_workers or os.cpu_count()
+
+        # content sha256 -> [ahash, dhash, phash] as hex, so aliases hash once
+        self.cache = {}
+        if self.cache_file.exists():
+            try:
+                with open(self.cache_file, 'r') as f:
+                    self.cache = json.load(f)
+            except (OSError, ValueError):
+                self.cache = {}
+
+    def _hash_all(self, assets):
+        """Fill the cache for every payload not hashed before"""
+        missing = sorted({row["sha256"]: row["path"] for row in assets if row["sha256"] not in self.cache}.items())
+        if not missing:
+            return 0
+
+        stacks, digests = [], []
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [(digest, path, executor.submit(load_gray, str(self.images_dir / path)))
+                       for digest, path in missing]
+            for digest, path, future in futures:
+                try:
+                    stacks.append(future.result())
+                    digests.append(digest)
+                except Exception as e:
+                    print(f"✗ Failed to hash {path}: {e}")
+
+        if stacks:
+            ahashes, dhashes, phashes = perceptual_hashes(np.stack(stacks))
+            for digest, a, d, p in zip(digests, ahashes, dhashes, phashes):
+                self.cache[digest] = [f"{a:016x}", f"{d:016x}", f"{p:016x}"]
+        return len(stacks)
+
+    def find_groups(self, assets):
+        """Cluster assets whose pHash (confirmed by dHash) is within the distance"""
+        tree = BKTree()
+        hashes = {}
+        for row in assets:
+            if row["sha256"] in self.cache:
+                ahash, dhash, phash = (int(h, 16) for h in self.cache[row["sha256"]])
+                hashes[row["path"]] = (ahash, dhash, phash)
+                tree.add(phash, row["path"])
+
+        # Union-find over the near-duplicate pairs
+        parent = {path: path for path in hashes}
+
+        def find(path):
+            while parent[path] != path:
+                parent[path] = parent[parent[path]]
+                path = parent[path]
+            return path
+
+        for path, (_, dhash, phash) in hashes.items():
+            for distance, other in tree.search(phash, self.distance):
+                if other == path or hamming(dhash, hashes[other][1]) > 2 * self.distance:
+                    continue
+                parent[find(other)] = find(path)
+
+        groups = {}
+        for path in hashes:
+            groups.setdefault(find(path), []).append(path)
+        return [sorted(members) for members in groups.values() if len(members) > 1]
+
+    def _same_aspect(self, a, b):
+        if not (a["width"] and a["height"] and b["width"] and b["height"]):
+            return False
+        return abs(a["width"] / a["height"] - b["width"] / b["height"]) <= ALIAS_ASPECT_TOLERANCE * b["width"] / b["height"]
+
+    def run(self, alias=False):
+        """Hash the library, report near-duplicate groups and optionally alias them"""
+        print("🔍 Finding near-duplicate images...")
+
+        manifest = ImageManifest(self.images_dir)
+        manifest.reconcile()
+        assets = [dict(row) for row in manifest.all_assets() if row["sha256"]]
+        by_path = {row["path"]: row for row in assets}
+
+        hashed = self._hash_all(assets)
+        tmp_path = self.cache_file.with_suffix(".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(self.cache, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.cache_file)
+
+        groups = self.find_groups(assets)
+
+        report = []
+        reclaimable = 0
+        for members in groups:
+            # Keep the largest rendition; everything else can point at it
+            canonical = max(members, key=lambda p: ((by_path[p]["width"] or 0) * (by_path[p]["height"] or 0),
+                                                    by_path[p]["size"], p))
+            entries = []
+            for path in members:
+                if path == canonical:
+                    continue
+                canonical_phash = int(self.cache[by_path[canonical]["sha256"]][2], 16)
+                distance = hamming(canonical_phash, int(self.cache[by_path[path]["sha256"]][2], 16))
+                exact = by_path[path]["sha256"] == by_path[canonical]["sha256"]
+                if not exact:
+                    reclaimable += by_path[path]["size"]
+                entries.append({"path": path, "distance": distance, "exact": exact,
+                                "same_aspect": self._same_aspect(by_path[path], by_path[canonical])})
+            report.append({"canonical": canonical, "duplicates": entries})
+
+        report.sort(key=lambda group: group["canonical"])
+        tmp_path = self.report_file.with_suffix(".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump({"distance": self.distance, "groups": report}, f, indent=2)
+        os.replace(tmp_path, self.report_file)
+
+        near = sum(1 for group in report for entry in group["duplicates"] if not entry["exact"])
+        print(f"✓ Hashed {hashed} new payloads, {len(assets)} images checked")
+        print(f"✓ {len(report)} duplicate groups, {near} near-duplicates ({reclaimable:,} bytes reclaimable)")
+        print(f"📁 Report written to: {self.report_file}")
+
+        if alias:
+            self._alias(report, manifest)
+        manifest.close()
+        return report
+
+    def _alias(self, report, manifest):
+        """Hardlink near-identical duplicates to their canonical copy"""
+        blobs = BlobStore(self.images_dir / ".blobs")
+        aliased = 0
+        for group in report:
+            canonical = self.images_dir / group["canonical"]
+            for entry in group["duplicates"]:
+                if entry["exact"] or entry["distance"] > ALIAS_DISTANCE or not entry["same_aspect"]:
+                    continue
+                target = self.images_dir / entry["path"]
+                try:
+                    blobs.place(canonical, target)
+                    manifest.record_copy(canonical, target)
+                    aliased += 1
+                    print(f"🔗 Aliased: {entry['path']} → {group['canonical']}")
+                except Exception as e:
+                    print(f"✗ Failed to alias {entry['path']}: {e}")
+        blobs.save()
+        print(f"✓ {aliased} near-duplicates aliased")
+
+def main():
+    parser = argparse.ArgumentParser(description='Find near-duplicate images with perceptual hashes')
+    parser.add_argument('--images', '-i', default='images', help='Images directory')
+    parser.add_argument('--distance', '-d', type=int, default=NEAR_DISTANCE, help='Max pHash Hamming distance')
+    parser.add_argument('--alias', action='store_true',
+                        help=f'Hardlink duplicates within distance {ALIAS_DISTANCE} to their best copy')
+    parser.add_argument('--workers', '-w', type=int, default=None, help='Worker processes (default: all cores)')
+
+    args = parser.parse_args()
+
+    ImageDeduplicator(args.images, distance=args.distance, max_workers=args.workers).run(alias=args.alias)
+
+if __name__ == "__main__":
+    main()
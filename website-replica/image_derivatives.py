@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Responsive Image Derivative Generator
+Builds a fixed ladder of widths in AVIF/WebP/JPEG for every image listed in
+image_index.json and records the results back into the index.
+"""
+
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from PIL import Image, ImageOps, features
+
+from image_manifest import ImageManifest
+
+WIDTHS = (320, 640, 960, 1280)
+
+# format -> (file extension, Pillow save options)
+FORMATS = {
+    "avif": (".avif", {"quality": 55, "speed": 6}),
+    "webp": (".webp", {"quality": 80, "method": 6}),
+    "jpeg": (".jpg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+def supported_formats(formats):
+    """Drop formats the installed Pillow cannot encode"""
+    available = []
+    for fmt in formats:
+        if fmt == "jpeg" or features.check(fmt):
+            available.append(fmt)
+        else:
+            print(f"⚠️ Pillow has no {fmt.upper()} encoder, skipping it")
+    return available
+
+def indexed_images(image_index):
+    """List image paths (relative to the images dir) named by the index"""
+    paths = [f"products/{name}" for name in image_index.get("products", [])]
+    for category, names in image_index.get("categories", {}).items():
+        paths.extend(f"categories/{category}/{name}" for name in names)
+    paths.extend(f"categories/{name}" for name in image_index.get("backgrounds", []))
+    paths.extend(f"banners/{name}" for name in image_index.get("banners", []))
+    return paths
+
+def build_derivatives(images_dir, rel_path, output_dir, widths, formats):
+    """Render every width/format of one source image (runs in a worker process)"""
+    images_dir = Path(images_dir)
+    source = images_dir / rel_path
+    stem = Path(rel_path).with_suffix("")
+    source_mtime = source.stat().st_mtime_ns
+
+    with Image.open(source) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        width, height = img.size
+
+        # Never upscale; the source width stands in for larger steps
+        ladder = sorted({min(w, width) for w in widths})
+
+        variants = {fmt: [] for fmt in formats}
+        for target_width in ladder:
+            target_height = max(1, round(height * target_width / width))
+            resized = None
+
+            for fmt in formats:
+                ext, options = FORMATS[fmt]
+                rel_output = f"{output_dir}/{stem}-{target_width}{ext}"
+                output = images_dir / rel_output
+
+                # Incremental: keep derivatives newer than their source
+                if not output.exists() or output.stat().st_mtime_ns < source_mtime:
+                    if resized is None:
+                        resized = img if target_width == width else img.resize(
+                            (target_width, target_height), Image.Resampling.LANCZOS)
+                    output.parent.mkdir(parents=True, exist_ok=True)
+                    tmp_path = output.with_name(f".{output.name}.{os.getpid()}.tmp")
+                    resized.save(tmp_path, format=fmt.upper(), **options)
+                    os.replace(tmp_path, output)
+
+                variants[fmt].append({
+                    "width": target_width,
+                    "height": target_height,
+                    "path": rel_output,
+                })
+
+    return rel_path, {"width": width, "height": height, "variants": variants}
+
+class DerivativeBuilder:
+    def __init__(self, images_dir="images", widths=WIDTHS, formats=("avif", "webp", "jpeg"),
+                 output_dir="derivatives", max_workers=None):
+        self.images_dir = Path(images_dir)
+        self.index_file = self.images_dir / "image_index.json"
+        self.widths = tuple(widths)
+        self.formats = supported_formats(formats)
+        self.output_dir = output_dir
+        self.max_workers = max_workers or os.cpu_count()
+
+    def build_all(self):
+        """Build derivatives for every indexed image across all cores"""
+        print("🖼️ Building responsive image derivatives...")
+
+        with open(self.index_file, 'r') as f:
+            image_index = json.load(f)
+
+        sources = [p for p in indexed_images(image_index) if (self.images_dir / p).exists()]
+        derivatives = {}
+
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(build_derivatives, str(self.images_dir), rel_path,
+                                self.output_dir, self.widths, self.formats): rel_path
+                for rel_path in sources
+            }
+            for future, rel_path in futures.items():
+                try:
+                    rel_path, entry = future.result()
+                    derivatives[rel_path] = entry
+                except Exception as e:
+                    print(f"✗ Failed to build derivatives for {rel_path}: {e}")
+
+        image_index["derivatives"] = dict(sorted(derivatives.items()))
+        tmp_path = self.index_file.with_suffix(".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(image_index, f, indent=2)
+        os.replace(tmp_path, self.index_file)
+
+        manifest = ImageManifest(self.images_dir)
+        for rel_path, entry in derivatives.items():
+            manifest.set_derivatives(rel_path, entry)
+        manifest.close()
+
+        total = sum(len(v) for entry in derivatives.values() for v in entry["variants"].values())
+        print(f"✓ {total} derivatives for {len(derivatives)} images ({', '.join(self.formats)})")
+        return derivatives
+
+def main():
+    parser = argparse.ArgumentParser(description='Build responsive image derivatives')
+    parser.add_argument('--images', '-i', default='images', help='Images directory')
+    parser.add_argument('--widths', '-w', type=int, nargs='+', default=list(WIDTHS), help='Target widths')
+    parser.add_argument('--formats', '-f', nargs='+', default=['avif', 'webp', 'jpeg'], choices=sorted(FORMATS), help='Output formats')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: all cores)')
+
+    args = parser.parse_args()
+
+    builder = DerivativeBuilder(args.images, widths=args.widths, formats=args.formats, max_workers=args.workers)
+    builder.build_all()
+
+if __name__ == "__main__":
+    main()
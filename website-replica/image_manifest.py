@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+SQLite Image Manifest
+One indexed row per image asset (source URL, content hash, size, dimensions,
+format, category, derivatives, fetch time), updated as downloads and copies
+complete so lookups never need a directory scan. A directory mtime snapshot
+lets reconcile() rescan only the directories that changed.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from file_placement import file_digest
+from image_probe import ProbeError, probe_file
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS assets (
+    path        TEXT PRIMARY KEY,
+    name        TEXT NOT NULL,
+    kind        TEXT NOT NULL,
+    category    TEXT,
+    url         TEXT,
+    sha256      TEXT,
+    size        INTEGER,
+    width       INTEGER,
+    height      INTEGER,
+    format      TEXT,
+    derivatives TEXT,
+    fetched_at  REAL,
+    mtime_ns    INTEGER
+);
+CREATE INDEX IF NOT EXISTS assets_name ON assets (name);
+CREATE INDEX IF NOT EXISTS assets_category ON assets (kind, category);
+CREATE INDEX IF NOT EXISTS assets_sha256 ON assets (sha256);
+CREATE INDEX IF NOT EXISTS assets_url ON assets (url);
+CREATE TABLE IF NOT EXISTS directories (
+    path     TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL
+);
+"""
+
+COLUMNS = ("path", "name", "kind", "category", "url", "sha256", "size", "width", "height",
+           "format", "derivatives", "fetched_at", "mtime_ns")
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".avif"}
+
+# Generated output, not source assets
+SKIP_DIRS = {"derivatives"}
+
+def is_skipped(rel_path):
+    """True for anything under generated output or a hidden (state, temp) entry"""
+    return any(part in SKIP_DIRS or part.startswith('.') for part in Path(rel_path).parts)
+
+def is_asset(rel_path):
+    """True for an image inside an images subdirectory that is not skipped"""
+    parts = Path(rel_path).parts
+    return len(parts) > 1 and Path(rel_path).suffix.lower() in IMAGE_EXTENSIONS and not is_skipped(rel_path)
+
+def classify(rel_path):
+    """Map an images-relative path to (kind, category) as image_index.json groups it"""
+    parts = Path(rel_path).parts
+    if parts[0] == "categories":
+        if len(parts) == 2:
+            # categories/wine_bg.jpg is the background for the "wine" category
+            return "backgrounds", Path(parts[1]).stem.removesuffix("_bg")
+        return "categories", parts[1]
+    return parts[0], None
+
+class ImageManifest:
+    def __init__(self, images_dir="images", db_name="image_manifest.db"):
+        self.images_dir = Path(images_dir)
+        self.db_path = self.images_dir / db_name
+        self.images_dir.mkdir(parents=True, exist_ok=True)
+
+        # Download workers record from several threads through one connection
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def _rel(self, filename):
+        path = Path(filename)
+        try:
+            return path.relative_to(self.images_dir).as_posix()
+        except ValueError:
+            return path.resolve().relative_to(self.images_dir.resolve()).as_posix()
+
+    def _probe(self, filename):
+        """Read dimensions and format from the image header"""
+        try:
+            fmt, width, height = probe_file(filename)
+            return width, height, fmt
+        except (ProbeError, OSError):
+            return None, None, None
+
+    def record(self, filename, url=None, digest=None, fetched=False):
+        """Insert or refresh the row for a file that was just written or placed.
+
+        Unchanged files (same size and mtime) keep their stored hash and
+        dimensions; url and fetched_at are only overwritten when given.
+        """
+        rel_path = self._rel(filename)
+        stat = Path(filename).stat()
+        existing = self.get(rel_path)
+
+        if existing and existing["mtime_ns"] == stat.st_mtime_ns and existing["size"] == stat.st_size:
+            width, height, fmt = existing["width"], existing["height"], existing["format"]
+            digest = digest or existing["sha256"]
+        else:
+            width, height, fmt = self._probe(filename)
+            if digest is None:
+                digest = file_digest(filename)
+
+        kind, category = classify(rel_path)
+        row = {
+            "path": rel_path,
+            "name": Path(rel_path).name,
+            "kind": kind,
+            "category": category,
+            "url": url or (existing["url"] if existing else None),
+            "sha256": digest,
+            "size": stat.st_size,
+            "width": width,
+            "height": height,
+            "format": fmt,
+            "derivatives": existing["derivatives"] if existing else None,
+            "fetched_at": time.time() if fetched else (existing["fetched_at"] if existing else None),
+            "mtime_ns": stat.st_mtime_ns,
+        }
+
+        with self._lock:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO assets ({', '.join(COLUMNS)}) "
+                f"VALUES ({', '.join(':' + c for c in COLUMNS)})", row)
+            self.conn.commit()
+        return row
+
+    def record_copy(self, src, dst):
+        """Record dst as a placed copy of src, inheriting its source URL"""
+        source = self.get(self._rel(src))
+        return self.record(dst, url=source["url"] if source else None,
+                           digest=source["sha256"] if source else None)
+
+    def remove(self, filename):
+        with self._lock:
+            self.conn.execute("DELETE FROM assets WHERE path = ?", (self._rel(filename),))
+            self.conn.commit()
+
+    def set_derivatives(self, rel_path, entry):
+        """Attach a derivative ladder (as built by image_derivatives) to an asset"""
+        if self.get(rel_path) is None:
+            self.record(self.images_dir / rel_path)
+        with self._lock:
+            self.conn.execute("UPDATE assets SET derivatives = ? WHERE path = ?",
+                              (json.dumps(entry, sort_keys=True), rel_path))
+            self.conn.commit()
+
+    def get(self, rel_path):
+        with self._lock:
+            return self.conn.execute("SELECT * FROM assets WHERE path = ?", (rel_path,)).fetchone()
+
+    def all_assets(self):
+        with self._lock:
+            return self.conn.execute("SELECT * FROM assets ORDER BY path").fetchall()
+
+    def find_by_name(self, name):
+        with self._lock:
+            return self.conn.execute("SELECT * FROM assets WHERE name = ? ORDER BY path", (name,)).fetchall()
+
+    def find_by_category(self, category, kind="categories"):
+        with self._lock:
+            return self.conn.execute("SELECT * FROM assets WHERE kind = ? AND category = ? ORDER BY path",
+                                     (kind, category)).fetchall()
+
+    def find_by_hash(self, digest):
+        with self._lock:
+            return self.conn.execute("SELECT * FROM assets WHERE sha256 = ? ORDER BY path", (digest,)).fetchall()
+
+    def rebuild(self):
+        """Record every image under the images directory and drop rows for missing files"""
+        seen = set()
+        for path in sorted(self.images_dir.rglob("*")):
+            if path.is_file() and is_asset(path.relative_to(self.images_dir)):
+                seen.add(self.record(path)["path"])
+
+        with self._lock:
+            stale = [row["path"] for row in self.conn.execute("SELECT path FROM assets")
+                     if row["path"] not in seen]
+            self.conn.executemany("DELETE FROM assets WHERE path = ?", [(p,) for p in stale])
+            self.conn.commit()
+        return len(seen), len(stale)
+
+    def _rows_in(self, rel_dir):
+        """Assets stored directly in a directory, by path -> (size, mtime_ns)"""
+        prefix = f"{rel_dir}/"
+        with self._lock:
+            # '0' sorts right after '/', so this is an index range scan over the prefix
+            rows = self.conn.execute("SELECT path, size, mtime_ns FROM assets WHERE path >= ? AND path < ?",
+                                     (prefix, f"{rel_dir}0")).fetchall()
+        return {row["path"]: (row["size"], row["mtime_ns"])
+                for row in rows if '/' not in row["path"][len(prefix):]}
+
+    def reconcile(self):
+        """Bring the manifest in line with the disk, listing only changed directories.
+
+        Adding, removing or renaming a file bumps its directory's mtime, and
+        the downloaders only ever publish files by rename, so a directory
+        whose mtime matches the snapshot cannot hold unrecorded changes.
+        """
+        with self._lock:
+            snapshot = {row["path"]: row["mtime_ns"]
+                        for row in self.conn.execute("SELECT path, mtime_ns FROM directories")}
+
+        seen = {}
+        rescanned = recorded = 0
+        stale = []
+        stack = [""]
+        while stack:
+            rel_dir = stack.pop()
+            try:
+                mtime_ns = (self.images_dir / rel_dir).stat().st_mtime_ns
+            except FileNotFoundError:
+                continue
+            seen[rel_dir] = mtime_ns
+
+            if snapshot.get(rel_dir) == mtime_ns:
+                # Unchanged: its subdirectories are exactly the ones already known
+                prefix = f"{rel_dir}/" if rel_dir else ""
+                stack.extend(path for path in snapshot
+                             if path and path.startswith(prefix) and '/' not in path[len(prefix):])
+                continue
+
+            rescanned += 1
+            files = {}
+            with os.scandir(self.images_dir / rel_dir) as entries:
+                for entry in entries:
+                    rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        if not is_skipped(rel_path):
+                            stack.append(rel_path)
+                    elif is_asset(rel_path):
+                        stat = entry.stat()
+                        files[rel_path] = (stat.st_size, stat.st_mtime_ns)
+
+            if not rel_dir:
+                continue
+            known = self._rows_in(rel_dir)
+            for rel_path, signature in files.items():
+                if known.get(rel_path) != signature:
+                    self.record(self.images_dir / rel_path)
+                    recorded += 1
+            stale.extend(path for path in known if path not in files)
+
+        removed_dirs = [path for path in snapshot if path not in seen]
+        with self._lock:
+            self.conn.executemany("DELETE FROM assets WHERE path = ?", [(p,) for p in stale])
+            for rel_dir in removed_dirs:
+                self.conn.execute("DELETE FROM assets WHERE path >= ? AND path < ?", (f"{rel_dir}/", f"{rel_dir}0"))
+            self.conn.execute("DELETE FROM directories")
+            self.conn.executemany("INSERT INTO directories (path, mtime_ns) VALUES (?, ?)", seen.items())
+            self.conn.commit()
+
+        return {"directories": len(seen), "rescanned": rescanned, "recorded": recorded,
+                "removed": len(stale) + len(removed_dirs)}
+
+    def export_index(self, index_file=None):
+        """Write image_index.json from the manifest, keeping keys other tools added"""
+        index_file = Path(index_file) if index_file else self.images_dir / "image_index.json"
+
+        index_data = {}
+        if index_file.exists():
+            try:
+                with open(index_file, 'r') as f:
+                    index_data = json.load(f)
+            except (OSError, ValueError):
+                index_data = {}
+
+        index_data.update({"products": [], "categories": {}, "backgrounds": [], "banners": []})
+        with self._lock:
+            rows = self.conn.execute("SELECT name, kind, category FROM assets ORDER BY path").fetchall()
+        for row in rows:
+            if row["kind"] == "categories":
+                index_data["categories"].setdefault(row["category"], []).append(row["name"])
+            elif row["kind"] in ("products", "backgrounds", "banners"):
+                index_data[row["kind"]].append(row["name"])
+
+        content = json.dumps(index_data, indent=2)
+        previous = None
+        if index_file.exists():
+            with open(index_file, 'r') as f:
+                previous = f.read()
+        if content != previous:
+            tmp_path = index_file.with_suffix(".tmp")
+            with open(tmp_path, 'w') as f:
+                f.write(content)
+            os.replace(tmp_path, index_file)
+        return index_data
+
+    def stats(self):
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT kind, COUNT(*) AS files, COUNT(DISTINCT sha256) AS payloads, SUM(size) AS bytes "
+                "FROM assets GROUP BY kind ORDER BY kind").fetchall()
+        return {row["kind"]: dict(row) for row in rows}
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Query or rebuild the SQLite image manifest')
+    parser.add_argument('--images', '-i', default='images', help='Images directory')
+    parser.add_argument('--rebuild', action='store_true', help='Rescan the images directory into the manifest')
+    parser.add_argument('--reconcile', action='store_true', help='Rescan only directories changed since the last run')
+    parser.add_argument('--export', action='store_true', help='Write image_index.json from the manifest')
+    parser.add_argument('--name', help='Look up assets by file name')
+    parser.add_argument('--category', help='Look up category images')
+    parser.add_argument('--hash', help='Look up assets by SHA-256')
+
+    args = parser.parse_args()
+
+    manifest = ImageManifest(args.images)
+
+    if args.rebuild:
+        recorded, removed = manifest.rebuild()
+        print(f"✓ Manifest rebuilt: {recorded} assets recorded, {removed} stale rows removed")
+
+    if args.reconcile:
+        result = manifest.reconcile()
+        print(f"✓ Reconciled: {result['rescanned']}/{result['directories']} directories rescanned, "
+              f"{result['recorded']} recorded, {result['removed']} removed")
+
+    if args.export:
+        manifest.export_index()
+        print("✓ Image index exported: image_index.json")
+
+    rows = []
+    if args.name:
+        rows = manifest.find_by_name(args.name)
+    elif args.category:
+        rows = manifest.find_by_category(args.category)
+    elif args.hash:
+        rows = manifest.find_by_hash(args.hash)
+
+    for row in rows:
+        print(f"{row['path']}  {row['width']}x{row['height']} {row['format']}  {row['size']:,} bytes  "
+              f"{row['sha256'][:12]}  {row['url'] or '-'}")
+
+    if not (args.name or args.category or args.hash):
+        for kind, entry in manifest.stats().items():
+            print(f"📊 {kind}: {entry['files']} files, {entry['payloads']} unique, {entry['bytes'] or 0:,} bytes")
+
+    manifest.close()
+
+if __name__ == "__main__":
+    main()
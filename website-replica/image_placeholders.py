@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Low-Quality Image Placeholders
+Computes a tiny base64 thumbnail for every image in image_index.json so the
+HTML updater can inline it under the real background image.
+"""
+
+import argparse
+import base64
+import io
+import json
+import os
+from pathlib import Path
+
+from PIL import Image, ImageOps, features
+
+from image_derivatives import indexed_images
+from image_manifest import ImageManifest
+
+PLACEHOLDER_WIDTH = 20
+
+def make_placeholder(path, width=PLACEHOLDER_WIDTH):
+    """Render a ~20px thumbnail of an image as a data: URI"""
+    with Image.open(path) as img:
+        # Let the JPEG decoder scale down in the DCT instead of decoding full size
+        img.draft('RGB', (width * 2, width * 2))
+        img = ImageOps.exif_transpose(img).convert('RGB')
+
+        height = max(1, round(img.height * width / img.width))
+        thumb = img.resize((width, height), Image.Resampling.BILINEAR)
+
+    buffer = io.BytesIO()
+    if features.check('webp'):
+        thumb.save(buffer, format='WEBP', quality=40, method=6)
+        mime = 'image/webp'
+    else:
+        thumb.save(buffer, format='JPEG', quality=40, optimize=True)
+        mime = 'image/jpeg'
+
+    return f"data:{mime};base64,{base64.b64encode(buffer.getvalue()).decode('ascii')}"
+
+class PlaceholderBuilder:
+    def __init__(self, images_dir="images", width=PLACEHOLDER_WIDTH):
+        self.images_dir = Path(images_dir)
+        self.index_file = self.images_dir / "image_index.json"
+        self.cache_file = self.images_dir / ".placeholder_cache.json"
+        self.width = width
+
+        # content sha256 -> data URI, so renamed or aliased images are free
+        self.cache = {}
+        if self.cache_file.exists():
+            try:
+                with open(self.cache_file, 'r') as f:
+                    self.cache = json.load(f)
+            except (OSError, ValueError):
+                self.cache = {}
+
+    def build_all(self):
+        """Compute placeholders for every indexed image and record them in the index"""
+        print("🌫️ Building image placeholders...")
+
+        with open(self.index_file, 'r') as f:
+            image_index = json.load(f)
+
+        placeholders = {}
+        generated = 0
+        manifest = ImageManifest(self.images_dir)
+
+        for rel_path in indexed_images(image_index):
+            path = self.images_dir / rel_path
+            if not path.exists():
+                continue
+
+            try:
+                # The same image at another --width is a different placeholder
+                key = f"{self._digest(manifest, path, rel_path)}:{self.width}"
+                if key not in self.cache:
+                    self.cache[key] = make_placeholder(path, self.width)
+                    generated += 1
+                placeholders[rel_path] = self.cache[key]
+            except Exception as e:
+                print(f"✗ Failed to build placeholder for {rel_path}: {e}")
+        manifest.close()
+
+        image_index["placeholders"] = dict(sorted(placeholders.items()))
+        self._write_json(self.index_file, image_index)
+        self._write_json(self.cache_file, self.cache)
+
+        print(f"✓ {len(placeholders)} placeholders ({generated} newly generated)")
+        return placeholders
+
+    def _digest(self, manifest, path, rel_path):
+        """Content hash from the manifest, rehashing only files changed since it was recorded"""
+        stat = path.stat()
+        row = manifest.get(rel_path)
+        if row and row["sha256"] and row["size"] == stat.st_size and row["mtime_ns"] == stat.st_mtime_ns:
+            return row["sha256"]
+        return manifest.record(path)["sha256"]
+
+    def _write_json(self, path, data):
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+
+def main():
+    parser = argparse.ArgumentParser(description='Build low-quality image placeholders')
+    parser.add_argument('--images', '-i', default='images', help='Images directory')
+    parser.add_argument('--width', '-w', type=int, default=PLACEHOLDER_WIDTH, help='Placeholder width in pixels')
+
+    args = parser.parse_args()
+
+    PlaceholderBuilder(args.images, width=args.width).build_all()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Image Header Probe
+Reads format and pixel dimensions of JPEG, PNG, GIF and WebP files from
+their first bytes only, without decoding. Used to vet streaming downloads,
+and as a fast bulk audit of the images/ tree.
+"""
+
+import argparse
+import struct
+from pathlib import Path
+
+# Most headers resolve in a few hundred bytes; JPEG may sit behind EXIF/ICC
+# segments, so give up only past this many bytes
+PROBE_LIMIT = 256 * 1024
+
+# Smallest images worth shipping; anything below is a thumbnail or icon
+MIN_DIMENSIONS = (200, 200)
+
+# JPEG start-of-frame markers (not DHT/JPG/DAC, which share the range)
+JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+SUFFIXES = {
+    "jpeg": (".jpg", ".jpeg"),
+    "png": (".png",),
+    "gif": (".gif",),
+    "webp": (".webp",),
+}
+
+class ProbeError(ValueError):
+    """The bytes are not a supported image"""
+
+def _probe_jpeg(data):
+    i = 2
+    while True:
+        # Skip fill bytes up to the next marker
+        while i < len(data) and data[i] == 0xFF:
+            i += 1
+        if i + 3 > len(data):
+            return None
+        marker = data[i]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            i += 1
+            continue
+        if marker == 0xD9 or marker == 0xDA:
+            raise ProbeError("JPEG has no frame header before its scan data")
+
+        length = struct.unpack('>H', data[i + 1:i + 3])[0]
+        if marker in JPEG_SOF:
+            if i + 8 > len(data):
+                return None
+            height, width = struct.unpack('>HH', data[i + 4:i + 8])
+            return "jpeg", width, height
+        i += 1 + length
+        if i < len(data) and data[i] != 0xFF:
+            raise ProbeError("corrupt JPEG segment")
+        i += 1
+
+def _probe_webp(data):
+    if len(data) < 30:
+        return None
+    chunk = data[12:16]
+    if chunk == b'VP8 ':
+        if data[23:26] != b'\x9d\x01\x2a':
+            raise ProbeError("corrupt WebP frame")
+        width, height = struct.unpack('<HH', data[26:30])
+        return "webp", width & 0x3FFF, height & 0x3FFF
+    if chunk == b'VP8L':
+        if data[20] != 0x2F:
+            raise ProbeError("corrupt lossless WebP")
+        bits = int.from_bytes(data[21:25], 'little')
+        return "webp", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b'VP8X':
+        width = int.from_bytes(data[24:27], 'little') + 1
+        height = int.from_bytes(data[27:30], 'little') + 1
+        return "webp", width, height
+    raise ProbeError("unknown WebP chunk")
+
+def probe_image(data):
+    """Return (format, width, height) from leading bytes, or None if more are needed.
+
+    Raises ProbeError when the bytes cannot be a supported image.
+    """
+    if len(data) < 4:
+        return None
+
+    if data.startswith(b'\xff\xd8'):
+        return _probe_jpeg(data)
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        if len(data) < 24:
+            return None
+        if data[12:16] != b'IHDR':
+            raise ProbeError("PNG does not start with IHDR")
+        width, height = struct.unpack('>II', data[16:24])
+        return "png", width, height
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        if len(data) < 10:
+            return None
+        width, height = struct.unpack('<HH', data[6:10])
+        return "gif", width, height
+    if data.startswith(b'RIFF'):
+        if len(data) < 12:
+            return None
+        if data[8:12] != b'WEBP':
+            raise ProbeError("RIFF file is not WebP")
+        return _probe_webp(data)
+
+    if len(data) < 12:
+        return None
+    raise ProbeError("unrecognised image signature")
+
+def probe_file(path):
+    """Probe a file on disk, reading only as much of it as the header needs"""
+    data = b''
+    with open(path, 'rb') as f:
+        size = 512
+        while True:
+            chunk = f.read(size - len(data))
+            data += chunk
+            info = probe_image(data)
+            if info is not None:
+                return info
+            if not chunk or len(data) >= PROBE_LIMIT:
+                raise ProbeError("truncated image header")
+            size = min(size * 4, PROBE_LIMIT)
+
+def check_dimensions(info, min_dimensions):
+    """True when a probed image meets the minimum width and height"""
+    if not min_dimensions:
+        return True
+    _, width, height = info
+    return width >= min_dimensions[0] and height >= min_dimensions[1]
+
+def audit(images_dir, min_dimensions=MIN_DIMENSIONS):
+    """Probe every image under images_dir and list the ones that fail"""
+    images_dir = Path(images_dir)
+    checked = 0
+    problems = []
+
+    for path in sorted(images_dir.rglob("*")):
+        rel_parts = path.relative_to(images_dir).parts
+        if not path.is_file() or any(part.startswith('.') for part in rel_parts):
+            continue
+        if not any(path.suffix.lower() in suffixes for suffixes in SUFFIXES.values()):
+            continue
+
+        checked += 1
+        try:
+            info = probe_file(path)
+        except (ProbeError, OSError) as e:
+            problems.append((path, f"unreadable: {e}"))
+            continue
+
+        fmt, width, height = info
+        if not check_dimensions(info, min_dimensions):
+            problems.append((path, f"too small: {width}x{height}"))
+        elif path.suffix.lower() not in SUFFIXES[fmt]:
+            problems.append((path, f"{fmt.upper()} data with a {path.suffix} name"))
+
+    return checked, problems
+
+def main():
+    parser = argparse.ArgumentParser(description='Audit image headers without decoding')
+    parser.add_argument('--images', '-i', default='images', help='Images directory')
+    parser.add_argument('--min-width', type=int, default=MIN_DIMENSIONS[0], help='Minimum width in pixels')
+    parser.add_argument('--min-height', type=int, default=MIN_DIMENSIONS[1], help='Minimum height in pixels')
+
+    args = parser.parse_args()
+
+    print("🔎 Auditing image headers...")
+    checked, problems = audit(args.images, (args.min_width, args.min_height))
+
+    for path, reason in problems:
+        print(f"✗ {path}: {reason}")
+    print(f"✓ {checked} images checked, {len(problems)} problems")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Scrape Job Journal
+Durable SQLite record of every planned, in-flight, finished and failed
+download with its resulting path and hash. A run that was interrupted
+skips the jobs it already finished when restarted, and resumes partial
+downloads with an HTTP Range request. Once a run completes, the next one
+revalidates everything through the HTTP cache again.
+"""
+
+import argparse
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from file_placement import file_digest
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    path       TEXT PRIMARY KEY,
+    url        TEXT NOT NULL,
+    state      TEXT NOT NULL,
+    validator  TEXT,
+    sha256     TEXT,
+    size       INTEGER,
+    error      TEXT,
+    attempts   INTEGER NOT NULL DEFAULT 0,
+    run        INTEGER,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id           INTEGER PRIMARY KEY,
+    started_at   REAL NOT NULL,
+    completed_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_url ON jobs (url);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state);
+"""
+
+PLANNED = "planned"
+IN_FLIGHT = "in-flight"
+DONE = "done"
+FAILED = "failed"
+
+# Trailing _N counter the listing scrapers number generated file names with
+NAME_COUNTER = re.compile(r'^(.*?)(?:_(\d+))?$')
+
+class JobJournal:
+    def __init__(self, images_dir="images", db_name="job_journal.db"):
+        self.images_dir = Path(images_dir)
+        self.db_path = self.images_dir / db_name
+        self.images_dir.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(jobs)")}
+        if "run" not in columns:
+            self.conn.execute("ALTER TABLE jobs ADD COLUMN run INTEGER")
+
+        self.run_id = None
+
+    def begin_run(self):
+        """Resume the last run if it never completed, otherwise start a new one"""
+        with self._lock, self.conn:
+            last = self.conn.execute("SELECT id, completed_at FROM runs ORDER BY id DESC LIMIT 1").fetchone()
+            if last is not None and last["completed_at"] is None:
+                self.run_id = last["id"]
+            else:
+                self.run_id = self.conn.execute(
+                    "INSERT INTO runs (started_at) VALUES (?)", (time.time(),)).lastrowid
+        return self.run_id
+
+    def complete_run(self):
+        """Mark the current run finished; its jobs no longer count as done for the next one"""
+        if self.run_id is None:
+            return
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE runs SET completed_at = ? WHERE id = ?", (time.time(), self.run_id))
+        self.run_id = None
+
+    def _rel(self, filename):
+        path = Path(filename)
+        try:
+            return path.relative_to(self.images_dir).as_posix()
+        except ValueError:
+            return path.resolve().relative_to(self.images_dir.resolve()).as_posix()
+
+    def _row(self, rel_path):
+        return self.conn.execute("SELECT * FROM jobs WHERE path = ?", (rel_path,)).fetchone()
+
+    def _update(self, filename, **values):
+        values["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in values)
+        with self._lock, self.conn:
+            self.conn.execute(f"UPDATE jobs SET {assignments} WHERE path = ?",
+                              (*values.values(), self._rel(filename)))
+
+    def plan(self, url, filename, numbered=False):
+        """Record a job and return the file name it should use.
+
+        Fixed (hand-picked) names are used as given and overwrite their path.
+        For numbered names, which listing scrapers generate with a _N counter,
+        a URL journaled before under the same name family keeps its old file
+        name; a name already taken by another URL moves to the next free
+        counter instead of overwriting it.
+        """
+        filename = Path(filename)
+        rel_path = self._rel(filename)
+
+        if not numbered:
+            with self._lock, self.conn:
+                self.conn.execute(
+                    "INSERT INTO jobs (path, url, state, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (path) DO UPDATE SET url = excluded.url, "
+                    "state = CASE WHEN jobs.url = excluded.url THEN jobs.state ELSE excluded.state END, "
+                    "updated_at = excluded.updated_at",
+                    (rel_path, url, PLANNED, time.time()))
+            return filename
+
+        family, _ = NAME_COUNTER.match(filename.stem).groups()
+        parent = Path(rel_path).parent.as_posix()
+
+        with self._lock, self.conn:
+            row = self._row(rel_path)
+            if row is not None and row["url"] == url:
+                return filename
+
+            for other in self.conn.execute("SELECT path FROM jobs WHERE url = ?", (url,)):
+                other_path = Path(other["path"])
+                if (other_path.parent.as_posix() == parent and other_path.suffix == filename.suffix
+                        and NAME_COUNTER.match(other_path.stem).group(1) == family):
+                    return self.images_dir / other_path
+
+            if row is not None:
+                counter = 2
+                while True:
+                    candidate = filename.with_name(f"{family}_{counter}{filename.suffix}")
+                    if self._row(self._rel(candidate)) is None and not candidate.exists():
+                        break
+                    counter += 1
+                filename, rel_path = candidate, self._rel(candidate)
+
+            self.conn.execute(
+                "INSERT INTO jobs (path, url, state, updated_at) VALUES (?, ?, ?, ?)",
+                (rel_path, url, PLANNED, time.time()))
+        return filename
+
+    def is_done(self, url, filename):
+        """True when the current (resumed) run already finished the job and its file is intact"""
+        with self._lock:
+            row = self._row(self._rel(filename))
+        if row is None or row["url"] != url or row["state"] != DONE:
+            return False
+        if self.run_id is None or row["run"] != self.run_id:
+            return False
+        try:
+            return Path(filename).stat().st_size == row["size"]
+        except OSError:
+            return False
+
+    def partial_path(self, filename):
+        """Where an interrupted download of filename is kept for resuming"""
+        filename = Path(filename)
+        return filename.with_name(f".{filename.name}.part")
+
+    def validator(self, url, filename):
+        """ETag or Last-Modified the partial file was downloaded under, for If-Range"""
+        with self._lock:
+            row = self._row(self._rel(filename))
+        if row is None or row["url"] != url:
+            return None
+        return row["validator"]
+
+    def start(self, url, filename, validator=None):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO jobs (path, url, state, validator, attempts, updated_at) VALUES (?, ?, ?, ?, 1, ?) "
+                "ON CONFLICT (path) DO UPDATE SET url = excluded.url, state = excluded.state, "
+                "validator = excluded.validator, error = NULL, attempts = attempts + 1, "
+                "updated_at = excluded.updated_at",
+                (self._rel(filename), url, IN_FLIGHT, validator, time.time()))
+
+    def finish(self, url, filename, digest=None):
+        """Mark a job done, recording the hash and size of the file it produced"""
+        if digest is None:
+            digest = file_digest(filename)
+
+        size = Path(filename).stat().st_size
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO jobs (path, url, state, sha256, size, run, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (path) DO UPDATE SET url = excluded.url, state = excluded.state, "
+                "sha256 = excluded.sha256, size = excluded.size, error = NULL, validator = NULL, "
+                "run = excluded.run, updated_at = excluded.updated_at",
+                (self._rel(filename), url, DONE, digest, size, self.run_id, time.time()))
+
+    def fail(self, url, filename, error=None):
+        self._update(filename, state=FAILED, error=str(error) if error else None)
+
+    def unfinished(self):
+        """Jobs planned, interrupted or failed in earlier runs"""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT * FROM jobs WHERE state != ? ORDER BY path", (DONE,)).fetchall()
+
+    def stats(self):
+        with self._lock:
+            rows = self.conn.execute("SELECT state, COUNT(*) AS jobs FROM jobs GROUP BY state").fetchall()
+        return {row["state"]: row["jobs"] for row in rows}
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect the scrape job journal')
+    parser.add_argument('--images', '-i', default='images', help='Images directory')
+    parser.add_argument('--unfinished', action='store_true', help='List jobs that have not finished')
+
+    args = parser.parse_args()
+
+    journal = JobJournal(args.images)
+
+    if args.unfinished:
+        for row in journal.unfinished():
+            partial = journal.partial_path(journal.images_dir / row["path"])
+            resumable = f", {partial.stat().st_size:,} bytes resumable" if partial.exists() else ""
+            print(f"{row['state']:<9} {row['path']}  {row['url']}{resumable}"
+                  f"{'  (' + row['error'] + ')' if row['error'] else ''}")
+
+    for state, count in sorted(journal.stats().items()):
+        print(f"📊 {state}: {count} jobs")
+
+    journal.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Listing Page Parser
+Pulls <img> tags out of search-result pages with lxml's HTML tokenizer and a
+callback target, so no tree is built and nothing but image attributes is
+kept. Matches are yielded as the page is fed in, letting callers stop
+parsing once they have enough images.
+"""
+
+import re
+
+from lxml import etree
+
+# The only attributes the scrapers read
+IMAGE_ATTRIBUTES = ("src", "data-src", "srcset", "data-big-src", "class")
+
+# Bytes handed to the tokenizer between checks for new matches
+FEED_SIZE = 64 * 1024
+
+class _ImageCollector:
+    """Parser target that records img start tags and ignores everything else"""
+
+    def __init__(self):
+        self.found = []
+
+    def start(self, tag, attrib):
+        if tag == "img":
+            self.found.append({name: attrib[name] for name in IMAGE_ATTRIBUTES if name in attrib})
+
+    def end(self, tag):
+        pass
+
+    def data(self, data):
+        pass
+
+    def close(self):
+        pass
+
+def _matches(attrs, filters):
+    """Same attribute tests as BeautifulSoup's find_all(attrs=...)"""
+    for name, expected in filters.items():
+        value = attrs.get(name)
+        if expected is True:
+            if value is None:
+                return False
+        elif value is None:
+            return False
+        elif isinstance(expected, re.Pattern):
+            if not expected.search(value):
+                return False
+        elif value != expected:
+            return False
+    return True
+
+def iter_images(content, filters=None):
+    """Yield the attributes of each <img> in an HTML page that passes the filters.
+
+    filters maps attribute names to True (must be present), a string (exact
+    value) or a compiled regex (searched), like BeautifulSoup's attrs.
+    """
+    filters = filters or {}
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+
+    collector = _ImageCollector()
+    parser = etree.HTMLParser(target=collector, recover=True)
+
+    for offset in range(0, len(content), FEED_SIZE):
+        parser.feed(content[offset:offset + FEED_SIZE])
+        for attrs in collector.found:
+            if _matches(attrs, filters):
+                yield attrs
+        collector.found.clear()
+
+    try:
+        parser.close()
+    except etree.XMLSyntaxError:
+        # Raised for pages with no elements at all
+        return
+    for attrs in collector.found:
+        if _matches(attrs, filters):
+            yield attrs
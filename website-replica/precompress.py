@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Precompressed Asset Variants
+Writes .gz and .br siblings for every HTML, CSS and JS output at maximum
+compression, in parallel, so the edge can serve them without compressing
+per request. Files whose content hash is unchanged since the last run are
+skipped, including variants left out last time for not being smaller.
+"""
+
+import argparse
+import gzip
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from file_placement import atomic_write, file_digest
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+TEXT_EXTENSIONS = {".html", ".css", ".js", ".json", ".svg", ".txt", ".xml"}
+
+# Below this, compression headers outweigh any savings
+MIN_SIZE = 256
+
+def compress_file(path, use_brotli):
+    """Write .gz (and .br) variants of one file; runs in a worker process"""
+    path = Path(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    variants = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+    if use_brotli:
+        variants[".br"] = brotli.compress(data, quality=11, mode=brotli.MODE_TEXT)
+
+    sizes = {}
+    for suffix, compressed in variants.items():
+        target = path.with_name(path.name + suffix)
+        if len(compressed) < len(data):
+            atomic_write(target, compressed)
+            sizes[suffix] = len(compressed)
+        elif target.exists():
+            # A stale variant bigger than the file would be worse than none
+            target.unlink()
+
+    return str(path), len(data), sizes
+
+class Precompressor:
+    def __init__(self, root=".", max_workers=None):
+        self.root = Path(root)
+        self.state_file = self.root / ".precompress_state.json"
+        self.max_workers = max_workers or os.cpu_count()
+        self.use_brotli = brotli is not None
+
+        if not self.use_brotli:
+            print("⚠️ brotli module not installed, writing gzip variants only")
+
+        self.state = {}
+        if self.state_file.exists():
+            try:
+                with open(self.state_file, 'r') as f:
+                    self.state = json.load(f)
+            except (OSError, ValueError):
+                self.state = {}
+
+    def _targets(self):
+        """Find text outputs, skipping hidden directories and existing variants"""
+        for path in sorted(self.root.rglob("*")):
+            rel_parts = path.relative_to(self.root).parts
+            if any(part.startswith('.') for part in rel_parts):
+                continue
+            if path.is_file() and path.suffix in TEXT_EXTENSIONS and path.stat().st_size >= MIN_SIZE:
+                yield path
+
+    def _suffixes(self):
+        return [".gz", ".br"] if self.use_brotli else [".gz"]
+
+    def _is_current(self, path, digest):
+        """Check the recorded hash and that each variant is on disk or was dropped for size"""
+        entry = self.state.get(str(path))
+        if not isinstance(entry, dict) or entry.get("sha256") != digest:
+            return False
+        dropped = entry.get("dropped", [])
+        return all(suffix in dropped or path.with_name(path.name + suffix).exists()
+                   for suffix in self._suffixes())
+
+    def run(self):
+        """Compress every changed text output across all cores"""
+        print("🗜️ Precompressing HTML, CSS and JS outputs...")
+
+        pending = {}
+        skipped = 0
+        for path in self._targets():
+            digest = file_digest(path)
+            if self._is_current(path, digest):
+                skipped += 1
+            else:
+                pending[str(path)] = digest
+
+        original_total = 0
+        compressed_total = {".gz": 0, ".br": 0}
+
+        if pending:
+            with ProcessPoolExecutor(max_workers=min(self.max_workers, len(pending))) as executor:
+                futures = [executor.submit(compress_file, path, self.use_brotli) for path in pending]
+                for future in futures:
+                    try:
+                        path, size, sizes = future.result()
+                    except Exception as e:
+                        print(f"✗ Failed to compress: {e}")
+                        continue
+
+                    # Variants no smaller than the file are recorded so they are not retried
+                    dropped = [suffix for suffix in self._suffixes() if suffix not in sizes]
+                    self.state[path] = {"sha256": pending[path], "dropped": dropped}
+                    original_total += size
+                    for suffix, compressed in sizes.items():
+                        compressed_total[suffix] += compressed
+
+        tmp_path = self.state_file.with_suffix(".tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(dict(sorted(self.state.items())), f, indent=2)
+        os.replace(tmp_path, self.state_file)
+
+        print(f"✓ Compressed {len(pending)} files, {skipped} unchanged")
+        if original_total:
+            for suffix, total in compressed_total.items():
+                if total:
+                    print(f"   {suffix}: {original_total:,} → {total:,} bytes ({100 * total / original_total:.1f}%)")
+
+        return len(pending)
+
+def main():
+    parser = argparse.ArgumentParser(description='Write gzip and Brotli variants of text outputs')
+    parser.add_argument('--root', '-r', default='.', help='Directory to precompress (e.g. the dist/ build)')
+    parser.add_argument('--workers', '-w', type=int, default=None, help='Worker processes (default: all cores)')
+
+    args = parser.parse_args()
+
+    Precompressor(args.root, max_workers=args.workers).run()
+
+if __name__ == "__main__":
+    main()
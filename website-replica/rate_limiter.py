@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Adaptive Rate Limiting
+Per-host token buckets whose rate climbs while an origin answers and halves
+when it throttles, exponential backoff with jitter, Retry-After handling and
+a circuit breaker that stops requests to a host that keeps failing.
+"""
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+
+# Requests per second a bucket never drops below, and the additive step per success
+MIN_RATE = 0.1
+RATE_STEP = 0.1
+# Multiplier applied to the rate when a host throttles us
+SLOWDOWN_FACTOR = 0.5
+
+# Backoff for retries without a Retry-After: full jitter over BASE * 2**attempt
+BASE_BACKOFF = 1.0
+MAX_BACKOFF = 30.0
+# Longest Retry-After honoured in place; anything longer opens the circuit
+MAX_RETRY_AFTER = 120.0
+
+# Consecutive failures that open a host's circuit, and how long it stays open
+FAILURE_THRESHOLD = 5
+COOLDOWN = 60.0
+
+# Statuses worth retrying: throttling and transient server trouble
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of sending a request to a host whose circuit is open"""
+
+class TokenBucket:
+    """Per-host request budget whose refill rate adapts to the origin's replies"""
+
+    def __init__(self, rate, burst=1, max_rate=None):
+        self.rate = rate
+        self.burst = burst
+        self.max_rate = max(max_rate or rate, rate)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, sleeping until it is available"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+            # Reserve the token now (possibly going into debt) so waiters queue in order
+            self.tokens -= 1
+            wait = max(-self.tokens / self.rate, self.paused_until - now, 0)
+
+        if wait > 0:
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Hold every request to the host for the given time"""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def slow_down(self):
+        with self._lock:
+            self.rate = max(MIN_RATE, self.rate * SLOWDOWN_FACTOR)
+
+    def speed_up(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + RATE_STEP)
+
+class CircuitBreaker:
+    """Closed while a host answers; open after repeated failures, then half-open for one trial"""
+
+    def __init__(self, threshold=FAILURE_THRESHOLD, cooldown=COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True when a request may be sent"""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if not self.probing and time.monotonic() - self.opened_at >= self.cooldown:
+                self.probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.threshold:
+                self._open()
+
+    def trip(self):
+        """Open the circuit immediately"""
+        with self._lock:
+            self._open()
+
+    def _open(self):
+        self.opened_at = time.monotonic()
+        self.probing = False
+
+def response_of(error):
+    return getattr(error, 'response', None)
+
+def is_transient(error):
+    """True for failures a later retry may get past"""
+    if isinstance(error, (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)):
+        return True
+    response = response_of(error)
+    return response is not None and response.status_code in RETRY_STATUSES
+
+def is_throttled(error):
+    response = response_of(error)
+    return response is not None and response.status_code == 429
+
+def retry_after(error):
+    """Seconds the server asked us to wait, from a Retry-After header"""
+    response = response_of(error)
+    if response is None:
+        return None
+
+    value = response.headers.get('retry-after', '').strip()
+    if not value:
+        return None
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt):
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(MAX_BACKOFF, BASE_BACKOFF * 2 ** attempt))
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Offline Scraper Benchmark
+Starts a local stand-in origin that serves synthetic listing pages in each
+source site's markup and generated JPEGs, with injectable latency, 5xx
+errors and 429s. Each scraper mode runs against it in a fresh process,
+cold and then warm, and the harness reports images/s, bytes/s, p50/p99
+download latency and peak RSS.
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import random
+import resource
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+import requests
+from PIL import Image
+
+# Distinct generated payloads; each image URL maps to one of them by hash
+IMAGE_VARIANTS = 8
+
+# Listing pages by the host the scrapers request them from
+LISTING_HOSTS = {"www.wine.com", "unsplash.com", "www.pexels.com", "pixabay.com", "www.freeimages.com"}
+
+def _listing_image(host, key, i):
+    """One result tile in the markup shape the host's scraper looks for"""
+    if host == "www.wine.com":
+        return f'<img class="product-image" src="https://images.wine.com/p/{key}/{i}_150x150.jpg" alt="">'
+    if host == "unsplash.com":
+        return (f'<img src="https://images.unsplash.com/photo-{key}-{i}?w=400&h=300" '
+                f'srcset="https://images.unsplash.com/photo-{key}-{i}?w=200 200w" alt="">')
+    if host == "www.pexels.com":
+        return (f'<img data-big-src="https://images.pexels.com/photos/{key}-{i}.jpeg" '
+                f'src="https://images.pexels.com/photos/{key}-{i}-small.jpeg" alt="">')
+    if host == "pixabay.com":
+        return (f'<img srcset="https://cdn.pixabay.com/photo/{key}-{i}_340.jpg 1x" '
+                f'src="https://cdn.pixabay.com/photo/{key}-{i}_340.jpg" alt="">')
+    return f'<img class="img-responsive" src="https://images.freeimages.com/images/{key}-{i}.jpg" alt="">'
+
+def listing_page(host, path, images_per_page, page_kb):
+    """A search-result page padded with non-image markup to about page_kb"""
+    key = hashlib.sha1(path.encode()).hexdigest()[:10]
+    tiles = [f'<div class="tile"><a href="/item/{key}/{i}">{_listing_image(host, key, i)}'
+             f'<span class="title">Result {i}</span></a></div>' for i in range(images_per_page)]
+
+    filler = []
+    size = sum(len(tile) for tile in tiles)
+    while size < page_kb * 1024:
+        block = (f'<div class="card"><p>Related search {len(filler)} for {key}</p>'
+                 f'<script>window.__data_{len(filler)} = {{"id": "{key}", "n": {len(filler)}}};</script></div>')
+        filler.append(block)
+        size += len(block)
+
+    body = ''.join(tiles[:len(tiles) // 2] + filler + tiles[len(tiles) // 2:])
+    return f'<!DOCTYPE html><html><head><title>{host}</title></head><body>{body}</body></html>'.encode()
+
+def generate_images(width, height, quality):
+    """IMAGE_VARIANTS noise JPEGs; noise keeps them from compressing to nothing"""
+    variants = []
+    for i in range(IMAGE_VARIANTS):
+        img = Image.effect_noise((width, height), 20 + 10 * i).convert('RGB')
+        buffer = io.BytesIO()
+        img.save(buffer, 'JPEG', quality=quality)
+        variants.append(buffer.getvalue())
+    return variants
+
+class OriginState:
+    """Stand-in origin configuration plus counters of what it served"""
+
+    def __init__(self, images, images_per_page=12, page_kb=200, latency=0.0, error_rate=0.0,
+                 throttle_rate=0.0, retry_after=1, seed=0):
+        self.images = images
+        self.images_per_page = images_per_page
+        self.page_kb = page_kb
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counts = {"pages": 0, "images": 0, "not_modified": 0, "errors": 0, "throttled": 0}
+            self.bytes = 0
+
+    def count(self, key, size=0):
+        with self._lock:
+            self.counts[key] += 1
+            self.bytes += size
+
+    def roll(self):
+        """Decide this request's fate: None, 'error' or 'throttle'"""
+        with self._lock:
+            draw = self.random.random()
+            delay = self.latency * self.random.uniform(0.5, 1.5)
+        if draw < self.throttle_rate:
+            return 'throttle', delay
+        if draw < self.throttle_rate + self.error_rate:
+            return 'error', delay
+        return None, delay
+
+class OriginHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b'', headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def do_GET(self):
+        state = self.server.state
+        # The client adapter sends https://host/path as /host/path
+        host, _, path = unquote(self.path).lstrip('/').partition('/')
+        path = '/' + path
+
+        fate, delay = state.roll()
+        if delay:
+            time.sleep(delay)
+        if fate == 'throttle':
+            state.count("throttled")
+            return self._send(429, headers={'Retry-After': str(state.retry_after)})
+        if fate == 'error':
+            state.count("errors")
+            return self._send(503)
+
+        if host in LISTING_HOSTS:
+            body = listing_page(host, path, state.images_per_page, state.page_kb)
+            state.count("pages", len(body))
+            return self._send(200, body, {'Content-Type': 'text/html; charset=utf-8'})
+
+        variant = int(hashlib.sha1(f"{host}{path}".encode()).hexdigest(), 16) % len(state.images)
+        body = state.images[variant]
+        etag = f'"v{variant}-{len(body)}"'
+        if self.headers.get('If-None-Match') == etag:
+            state.count("not_modified")
+            return self._send(304, headers={'ETag': etag})
+
+        headers = {'Content-Type': 'image/jpeg', 'ETag': etag, 'Cache-Control': 'no-cache'}
+        range_header = self.headers.get('Range', '')
+        if range_header.startswith('bytes=') and self.headers.get('If-Range') == etag:
+            start = int(range_header[6:].split('-')[0])
+            headers['Content-Range'] = f"bytes {start}-{len(body) - 1}/{len(body)}"
+            state.count("images", len(body) - start)
+            return self._send(206, body[start:], headers)
+
+        state.count("images", len(body))
+        return self._send(200, body, headers)
+
+class LocalOriginAdapter(requests.adapters.HTTPAdapter):
+    """Routes every request to the stand-in origin, keeping the real host in the path"""
+
+    def __init__(self, origin, **kwargs):
+        self.origin = origin
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        request.url = f"{self.origin}/{parts.netloc}{parts.path}" + (f"?{parts.query}" if parts.query else "")
+        return super().send(request, **kwargs)
+
+def start_origin(state):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), OriginHandler)
+    server.daemon_threads = True
+    server.state = state
+    threading.Thread(target=server.serve_forever, name="origin", daemon=True).start()
+    return server
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+def run_mode(mode, origin, output_dir, workers, rate, max_rate, verbose):
+    """Run one scraper mode against the origin (in a worker process) and time it"""
+    if mode == "basic":
+        from scrape_images import LiquorImageScraper
+        scraper = LiquorImageScraper(output_dir, max_workers=workers)
+        run = scraper.run_scraping
+    else:
+        from scrape_more_images import EnhancedLiquorImageScraper
+        scraper = EnhancedLiquorImageScraper(output_dir, max_workers=workers)
+        run = scraper.run_full_scraping
+
+    adapter = LocalOriginAdapter(origin, pool_maxsize=workers)
+    scraper.session.mount('https://', adapter)
+    scraper.session.mount('http://', adapter)
+    scraper.engine.rate = rate
+    scraper.engine.max_rate = max_rate
+
+    latencies = []
+    successes = []
+    download = scraper.download_image
+
+    def timed_download(url, filename, min_size=5000, deadline=None):
+        start = time.perf_counter()
+        downloaded = False
+        try:
+            downloaded = download(url, filename, min_size, deadline=deadline)
+            return downloaded
+        finally:
+            latencies.append(time.perf_counter() - start)
+            successes.append(bool(downloaded))
+
+    scraper.download_image = timed_download
+
+    # Jobs the journal already finished never reach download_image
+    resumed = []
+    is_done = scraper.journal.is_done
+
+    def counted_is_done(url, filename):
+        done = is_done(url, filename)
+        if done:
+            resumed.append(filename)
+        return done
+
+    scraper.journal.is_done = counted_is_done
+
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    start = time.perf_counter()
+    with output:
+        run()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "elapsed": elapsed,
+        "images": sum(successes) + len(resumed),
+        "downloaded": sum(successes),
+        "resumed": len(resumed),
+        "attempts": len(successes),
+        "p50": percentile(latencies, 0.50),
+        "p99": percentile(latencies, 0.99),
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+class ScrapeBenchmark:
+    def __init__(self, modes=("basic", "enhanced"), warm=True, workers=8, rate=2.0, max_rate=10.0,
+                 verbose=False, **origin_options):
+        self.modes = modes
+        self.warm = warm
+        self.workers = workers
+        self.rate = rate
+        self.max_rate = max_rate
+        self.verbose = verbose
+        self.origin_options = origin_options
+
+    def run(self, image_size=(800, 600), quality=85):
+        print("⏱️ Benchmarking scrapers against a local origin...")
+        images = generate_images(*image_size, quality)
+        state = OriginState(images, **self.origin_options)
+        server = start_origin(state)
+        origin = f"http://127.0.0.1:{server.server_address[1]}"
+        print(f"✓ Origin at {origin}: {len(images)} images of {image_size[0]}x{image_size[1]}, "
+              f"~{sum(map(len, images)) // len(images):,} bytes each")
+
+        results = []
+        try:
+            for mode in self.modes:
+                output_dir = tempfile.mkdtemp(prefix=f"scrape-bench-{mode}-")
+                try:
+                    for phase in (("cold", "warm") if self.warm else ("cold",)):
+                        state.reset()
+                        # A fresh process per run, so peak RSS belongs to that run alone
+                        with ProcessPoolExecutor(max_workers=1) as executor:
+                            result = executor.submit(run_mode, mode, origin, output_dir, self.workers,
+                                                     self.rate, self.max_rate, self.verbose).result()
+                        result.update(mode=mode, phase=phase, served=dict(state.counts), bytes=state.bytes)
+                        results.append(result)
+                finally:
+                    shutil.rmtree(output_dir, ignore_errors=True)
+        finally:
+            server.shutdown()
+
+        self.print_report(results)
+        return results
+
+    def print_report(self, results):
+        print(f"\n{'Mode':<16}{'Images':>8}{'Img/s':>8}{'MB/s':>8}{'p50 ms':>9}{'p99 ms':>9}"
+              f"{'RSS MB':>8}{'429s':>6}{'5xx':>6}{'304s':>6}")
+        for r in results:
+            elapsed = r["elapsed"] or 1e-9
+            print(f"{r['mode'] + ' ' + r['phase']:<16}{r['images']:>8}{r['images'] / elapsed:>8.1f}"
+                  f"{r['bytes'] / elapsed / 1e6:>8.2f}{r['p50'] * 1000:>9.0f}{r['p99'] * 1000:>9.0f}"
+                  f"{r['peak_rss_mb']:>8.0f}{r['served']['throttled']:>6}{r['served']['errors']:>6}"
+                  f"{r['served']['not_modified']:>6}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the scrapers against a local stand-in origin')
+    parser.add_argument('--modes', nargs='+', choices=['basic', 'enhanced'], default=['basic', 'enhanced'],
+                        help='Scraper modes to run')
+    parser.add_argument('--no-warm', action='store_true', help='Skip the second run against warm caches')
+    parser.add_argument('--workers', '-w', type=int, default=8, help='Concurrent download workers')
+    parser.add_argument('--rate', type=float, default=2.0, help='Initial requests/s per host')
+    parser.add_argument('--max-rate', type=float, default=10.0, help='Requests/s per host the limiter may climb to')
+    parser.add_argument('--image-size', default='800x600', help='Generated image dimensions, WxH')
+    parser.add_argument('--quality', type=int, default=85, help='JPEG quality of generated images')
+    parser.add_argument('--images-per-page', type=int, default=12, help='Image tiles per listing page')
+    parser.add_argument('--page-kb', type=int, default=200, help='Approximate listing page size')
+    parser.add_argument('--latency', type=float, default=0.05, help='Mean response latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered 503')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of requests answered 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds sent with 429s')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for injected latency and failures')
+    parser.add_argument('--json', help='Also write the results to this JSON file')
+    parser.add_argument('--verbose', '-v', action='store_true', help='Show scraper output')
+
+    args = parser.parse_args()
+
+    width, height = (int(n) for n in args.image_size.lower().split('x'))
+    benchmark = ScrapeBenchmark(
+        modes=args.modes, warm=not args.no_warm, workers=args.workers, rate=args.rate, max_rate=args.max_rate,
+        verbose=args.verbose, images_per_page=args.images_per_page, page_kb=args.page_kb, latency=args.latency,
+        error_rate=args.error_rate, throttle_rate=args.throttle_rate, retry_after=args.retry_after, seed=args.seed)
+    results = benchmark.run(image_size=(width, height), quality=args.quality)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"📁 Results written to: {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -5,23 +5,69 @@ Scrapes product images from various liquor websites for the ARAMAC website repli
 """
 
 import requests
-import os
-import time
-import json
-from urllib.parse import urljoin, urlparse
-from bs4 import BeautifulSoup
 import re
 from pathlib import Path
+from functools import partial
+from itertools import islice
 import argparse
+import bisect
+
+from download_engine import DownloadEngine, NOT_MODIFIED, stream_download
+from rate_limiter import CircuitOpenError
+from http_cache import HTTPCache
+from blob_store import BlobStore, LINKED
+from image_manifest import ImageManifest
+from image_probe import MIN_DIMENSIONS
+from job_journal import JobJournal
+from listing_parser import iter_images
+from scrape_pipeline import ScrapePipeline, Source, print_summary
+
+# Category images are named after brands and aliased from the first products
+CATEGORY_BRANDS = {
+    'wine': ['cabernet', 'chardonnay', 'merlot', 'pinot'],
+    'whiskey': ['scotch', 'bourbon', 'irish', 'canadian'],
+    'cognac': ['hennessy', 'remy', 'courvoisier', 'martell'],
+    'rum': ['bacardi', 'havana', 'mount_gay', 'malibu'],
+    'vodka': ['absolut', 'smirnoff', 'grey_goose', 'belvedere'],
+    'gin': ['tanqueray', 'bombay', 'hendrick', 'beefeater'],
+    'champagne': ['moet', 'veuve_clicquot', 'dom_perignon', 'krug']
+}
+
+BANNER_COUNT = 3
+
+# Images to download from each listing source unless the caller says otherwise
+LISTING_LIMITS = {
+    "Wine.com": 20,
+    "Unsplash": 15,
+    "Pexels": 10
+}
 
 class LiquorImageScraper:
-    def __init__(self, base_dir="images"):
+    def __init__(self, base_dir="images", max_workers=8):
         self.base_dir = Path(base_dir)
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         })
 
+        # Shared download pool with per-host limits (replaces fixed sleeps)
+        self.engine = DownloadEngine(max_workers=max_workers)
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        # Validators from earlier runs turn unchanged downloads into no-ops
+        self.cache = HTTPCache(self.base_dir / ".http_cache")
+
+        # Each unique payload is stored once; named files are hardlinks to it
+        self.blobs = BlobStore(self.base_dir / ".blobs")
+
+        # Per-asset metadata, recorded as each download or copy completes
+        self.manifest = ImageManifest(self.base_dir)
+
+        # Planned/in-flight/finished jobs, so an interrupted run resumes where it stopped
+        self.journal = JobJournal(self.base_dir)
+
         # Create directories
         self.products_dir = self.base_dir / "products"
         self.categories_dir = self.base_dir / "categories"
@@ -30,34 +76,37 @@ class LiquorImageScraper:
         for dir_path in [self.products_dir, self.categories_dir, self.banners_dir]:
             dir_path.mkdir(parents=True, exist_ok=True)
 
-    def download_image(self, url, filename, min_size=5000):
-        """Download an image with size validation"""
-        try:
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-
-            # Check content type
-            content_type = response.headers.get('content-type', '')
-            if not content_type.startswith('image/'):
-                return False
+        # Products the streaming organize stage has handled this run, in name order
+        self.organized = []
 
-            # Check size
-            if len(response.content) < min_size:
+    def download_image(self, url, filename, min_size=5000, deadline=None):
+        """Download an image with size validation; raises with the reason when it fails"""
+        try:
+            download = partial(stream_download, self.session, min_size=min_size, timeout=10,
+                               cache=self.cache, blobs=self.blobs, min_dimensions=MIN_DIMENSIONS,
+                               journal=self.journal, deadline=deadline)
+            # Retries with backoff and honours the host's rate limit and circuit
+            fetch = partial(self.engine.call, download)
+            result = self.blobs.fetch_once(url, filename, fetch)
+            if not result:
                 return False
 
-            # Save image
-            with open(filename, 'wb') as f:
-                f.write(response.content)
+            self.manifest.record(filename, url=url, digest=self.blobs.digest_of(filename), fetched=True)
 
-            print(f"✓ Downloaded: {filename.name}")
+            if result == LINKED:
+                print(f"🔗 Linked: {filename.name}")
+            elif result == NOT_MODIFIED:
+                print(f"↺ Unchanged: {filename.name}")
+            else:
+                print(f"✓ Downloaded: {filename.name}")
             return True
 
         except Exception as e:
             print(f"✗ Failed to download {url}: {e}")
-            return False
+            raise
 
-    def scrape_wine_com(self, max_images=20):
-        """Scrape wine images from wine.com"""
+    def scrape_wine_com(self):
+        """Yield download jobs from Wine.com listing pages"""
         print("🍷 Scraping Wine.com...")
 
         categories = [
@@ -67,47 +116,35 @@ class LiquorImageScraper:
             "rose-wine"
         ]
 
-        image_count = 0
+        found = 0
 
         for category in categories:
-            if image_count >= max_images:
-                break
-
+            url = f"https://www.wine.com/list/wine/{category}/7155-124-2-0"
             try:
-                url = f"https://www.wine.com/list/wine/{category}/7155-124-2-0"
-                response = self.session.get(url, timeout=10)
-                response.raise_for_status()
-
-                soup = BeautifulSoup(response.content, 'html.parser')
-
-                # Find product images
-                images = soup.find_all('img', {'class': re.compile(r'product-image')})
-
-                for img in images:
-                    if image_count >= max_images:
-                        break
-
-                    img_url = img.get('src') or img.get('data-src')
-                    if img_url:
-                        # Convert to high quality if available
-                        if '150x150' in img_url:
-                            img_url = img_url.replace('150x150', '300x300')
-
-                        filename = self.products_dir / f"wine_{category}_{image_count + 1}.jpg"
-
-                        if self.download_image(img_url, filename):
-                            image_count += 1
-
-                time.sleep(2)  # Be respectful
-
+                response = self.engine.fetch(self.session, url, timeout=10)
+            except CircuitOpenError as e:
+                print(f"⚠️ Giving up on Wine.com: {e}")
+                break
             except Exception as e:
                 print(f"Error scraping Wine.com {category}: {e}")
                 continue
 
-        return image_count
+            # Find product images
+            images = iter_images(response.content, {'class': re.compile(r'product-image')})
+
+            for img in images:
+                img_url = img.get('src') or img.get('data-src')
+                if img_url:
+                    # Convert to high quality if available
+                    if '150x150' in img_url:
+                        img_url = img_url.replace('150x150', '300x300')
 
-    def scrape_unsplash_liquor(self, max_images=15):
-        """Scrape liquor images from Unsplash"""
+                    filename = self.products_dir / f"wine_{category}_{found + 1}.jpg"
+                    found += 1
+                    yield img_url, filename, 5000
+
+    def scrape_unsplash_liquor(self):
+        """Yield download jobs from Unsplash listing pages"""
         print("📸 Scraping Unsplash liquor images...")
 
         # Unsplash search URLs for liquor-related terms
@@ -116,107 +153,73 @@ class LiquorImageScraper:
             "champagne", "wine-bottle", "liquor", "spirits"
         ]
 
-        image_count = 0
+        found = 0
 
         for term in search_terms:
-            if image_count >= max_images:
-                break
+            # Unsplash API approach (requires API key for production)
+            # For demo, we'll use direct search URLs
+            url = f"https://unsplash.com/s/photos/{term}"
 
             try:
-                # Unsplash API approach (requires API key for production)
-                # For demo, we'll use direct search URLs
-                url = f"https://unsplash.com/s/photos/{term}"
-
-                response = self.session.get(url, timeout=10)
-                response.raise_for_status()
-
-                soup = BeautifulSoup(response.content, 'html.parser')
-
-                # Find image elements
-                images = soup.find_all('img', {'src': re.compile(r'images\.unsplash\.com')})
-
-                for img in images[:3]:  # Limit per search term
-                    if image_count >= max_images:
-                        break
-
-                    img_url = img.get('src')
-                    if img_url and 'images.unsplash.com' in img_url:
-                        # Get higher quality version
-                        img_url = re.sub(r'(\?|&)w=\d+', r'\g<1>w=800', img_url)
-                        img_url = re.sub(r'(\?|&)h=\d+', r'\g<1>h=600', img_url)
-
-                        filename = self.products_dir / f"unsplash_{term}_{image_count + 1}.jpg"
-
-                        if self.download_image(img_url, filename, min_size=10000):
-                            image_count += 1
-
-                time.sleep(1)  # Be respectful
-
+                response = self.engine.fetch(self.session, url, timeout=10)
+            except CircuitOpenError as e:
+                print(f"⚠️ Giving up on Unsplash: {e}")
+                break
             except Exception as e:
                 print(f"Error scraping Unsplash {term}: {e}")
                 continue
 
-        return image_count
+            # Find image elements
+            images = iter_images(response.content, {'src': re.compile(r'images\.unsplash\.com')})
 
-    def scrape_pexels_liquor(self, max_images=10):
-        """Scrape liquor images from Pexels"""
+            for img in islice(images, 3):  # Limit per search term
+                img_url = img.get('src')
+                if img_url and 'images.unsplash.com' in img_url:
+                    # Get higher quality version
+                    img_url = re.sub(r'(\?|&)w=\d+', r'\g<1>w=800', img_url)
+                    img_url = re.sub(r'(\?|&)h=\d+', r'\g<1>h=600', img_url)
+
+                    filename = self.products_dir / f"unsplash_{term}_{found + 1}.jpg"
+                    found += 1
+                    yield img_url, filename, 10000
+
+    def scrape_pexels_liquor(self):
+        """Yield download jobs from Pexels listing pages"""
         print("🖼️ Scraping Pexels liquor images...")
 
         search_terms = ["wine", "whiskey", "cognac", "rum", "vodka"]
 
-        image_count = 0
+        found = 0
 
         for term in search_terms:
-            if image_count >= max_images:
-                break
-
+            url = f"https://www.pexels.com/search/{term}/"
             try:
-                url = f"https://www.pexels.com/search/{term}/"
-                response = self.session.get(url, timeout=10)
-                response.raise_for_status()
-
-                soup = BeautifulSoup(response.content, 'html.parser')
-
-                # Find image elements
-                images = soup.find_all('img', {'data-big-src': True})
-
-                for img in images[:2]:  # Limit per search term
-                    if image_count >= max_images:
-                        break
-
-                    img_url = img.get('data-big-src') or img.get('src')
-                    if img_url:
-                        filename = self.products_dir / f"pexels_{term}_{image_count + 1}.jpg"
-
-                        if self.download_image(img_url, filename, min_size=15000):
-                            image_count += 1
-
-                time.sleep(1.5)  # Be respectful
-
+                response = self.engine.fetch(self.session, url, timeout=10)
+            except CircuitOpenError as e:
+                print(f"⚠️ Giving up on Pexels: {e}")
+                break
             except Exception as e:
                 print(f"Error scraping Pexels {term}: {e}")
                 continue
 
-        return image_count
+            # Find image elements
+            images = iter_images(response.content, {'data-big-src': True})
+
+            for img in islice(images, 2):  # Limit per search term
+                img_url = img.get('data-big-src') or img.get('src')
+                if img_url:
+                    filename = self.products_dir / f"pexels_{term}_{found + 1}.jpg"
+                    found += 1
+                    yield img_url, filename, 15000
 
     def create_category_images(self):
         """Create category-specific images by renaming some products"""
         print("📁 Creating category-specific images...")
 
-        categories = {
-            'wine': ['cabernet', 'chardonnay', 'merlot', 'pinot'],
-            'whiskey': ['scotch', 'bourbon', 'irish', 'canadian'],
-            'cognac': ['hennessy', 'remy', 'courvoisier', 'martell'],
-            'rum': ['bacardi', 'havana', 'mount_gay', 'malibu'],
-            'vodka': ['absolut', 'smirnoff', 'grey_goose', 'belvedere'],
-            'gin': ['tanqueray', 'bombay', 'hendrick', 'beefeater'],
-            'champagne': ['moet', 'veuve_clicquot', 'dom_perignon', 'krug']
-        }
-
-        # Get list of downloaded images
-        product_images = list(self.products_dir.glob("*.jpg"))
+        # Get list of downloaded images, in name order so slots are stable
+        product_images = sorted(self.products_dir.glob("*.jpg"))
 
-        for category, brands in categories.items():
+        for category, brands in CATEGORY_BRANDS.items():
             category_dir = self.categories_dir / category
             category_dir.mkdir(exist_ok=True)
 
@@ -227,16 +230,15 @@ class LiquorImageScraper:
                     dst = category_dir / f"{brand}.jpg"
 
                     try:
-                        # Copy file
-                        with open(src, 'rb') as fsrc:
-                            with open(dst, 'wb') as fdst:
-                                fdst.write(fsrc.read())
+                        # Alias the product payload instead of copying it
+                        self.blobs.place(src, dst)
+                        self.manifest.record_copy(src, dst)
                         print(f"✓ Created category image: {dst.name}")
                     except Exception as e:
                         print(f"✗ Failed to create {dst.name}: {e}")
 
-    def download_featured_images(self):
-        """Download some specific featured product images"""
+    def featured_jobs(self):
+        """Download jobs for the featured product images"""
         print("🌟 Downloading featured product images...")
 
         # Some free-to-use liquor images from reliable sources
@@ -248,62 +250,101 @@ class LiquorImageScraper:
             "tanqueray_gin.jpg": "https://images.unsplash.com/photo-1551751299-1b51cab2694c?w=400"
         }
 
-        for filename, url in featured_images.items():
-            filepath = self.products_dir / filename
-            self.download_image(url, filepath, min_size=5000)
-            time.sleep(0.5)
+        return [
+            (url, self.products_dir / filename, 5000)
+            for filename, url in featured_images.items()
+        ]
+
+    def download_featured_images(self):
+        """Download some specific featured product images"""
+        self.engine.download_all(self.download_image, self.featured_jobs())
 
     def create_banner_images(self):
         """Create banner images from some of the downloaded images"""
         print("🎨 Creating banner images...")
 
         # Get some product images to use as banners
-        product_images = list(self.products_dir.glob("*.jpg"))[:3]
+        product_images = sorted(self.products_dir.glob("*.jpg"))[:BANNER_COUNT]
 
         for i, src in enumerate(product_images):
             dst = self.banners_dir / f"banner_{i + 1}.jpg"
             try:
-                with open(src, 'rb') as fsrc:
-                    with open(dst, 'wb') as fdst:
-                        fdst.write(fsrc.read())
+                self.blobs.place(src, dst)
+                self.manifest.record_copy(src, dst)
                 print(f"✓ Created banner: {dst.name}")
             except Exception as e:
                 print(f"✗ Failed to create banner {dst.name}: {e}")
 
-    def run_scraping(self):
-        """Run the complete scraping process"""
+    def _slot_targets(self, index):
+        """Category and banner files the index-th product (in name order) is aliased to"""
+        targets = [self.categories_dir / category / f"{brands[index]}.jpg"
+                   for category, brands in CATEGORY_BRANDS.items() if index < len(brands)]
+        if index < BANNER_COUNT:
+            targets.append(self.banners_dir / f"banner_{index + 1}.jpg")
+        return targets
+
+    def organize_image(self, src):
+        """Alias one freshly downloaded product into the category and banner slots it fills"""
+        if src.parent != self.products_dir or src in self.organized:
+            return
+
+        # Pipeline counterpart of create_category_images/create_banner_images:
+        # slots follow product names, not arrival order, so a product that
+        # sorts before ones already placed takes its slot and shifts them on
+        bisect.insort(self.organized, src)
+        for index in range(self.organized.index(src), len(self.organized)):
+            targets = self._slot_targets(index)
+            if not targets:
+                break
+
+            product = self.organized[index]
+            for dst in targets:
+                try:
+                    dst.parent.mkdir(exist_ok=True)
+                    self.blobs.place(product, dst)
+                    self.manifest.record_copy(product, dst)
+                    print(f"✓ Organized: {dst.name}")
+                except Exception as e:
+                    print(f"✗ Failed to organize {dst.name}: {e}")
+
+    def update_index(self):
+        self.manifest.export_index(self.base_dir / "image_index.json")
+
+    def run_scraping(self, limits=None):
+        """Run the complete scraping process; limits caps downloaded images per listing source"""
         print("🚀 Starting liquor image scraping process...")
         print("=" * 50)
 
-        total_images = 0
+        # The pipeline exports the index as files land; bring the manifest in
+        # line with the disk first so those exports keep earlier runs' images
+        result = self.manifest.reconcile()
+        print(f"↺ Rescanned {result['rescanned']}/{result['directories']} changed directories")
 
-        # Download featured images first
-        self.download_featured_images()
+        limits = limits or {}
 
-        # Scrape from multiple sources
-        sources = [
-            ("Wine.com", self.scrape_wine_com),
-            ("Unsplash", self.scrape_unsplash_liquor),
-            ("Pexels", self.scrape_pexels_liquor)
+        # Sources list concurrently (they are different hosts) and stream
+        # through one pipeline, so each stage starts on the first image
+        listings = {
+            "Wine.com": self.scrape_wine_com,
+            "Unsplash": self.scrape_unsplash_liquor,
+            "Pexels": self.scrape_pexels_liquor
+        }
+        sources = [Source("Featured", self.featured_jobs)]
+        sources += [
+            Source(name, jobs, limit=limits.get(name, LISTING_LIMITS[name]), numbered=True)
+            for name, jobs in listings.items()
         ]
+        pipeline = ScrapePipeline(self.download_image, organize=self.organize_image, index=self.update_index,
+                                  workers=self.engine.max_workers, journal=self.journal)
+        results = pipeline.run(sources)
 
-        for source_name, scraper_func in sources:
-            try:
-                images_downloaded = scraper_func()
-                total_images += images_downloaded
-                print(f"📊 {source_name}: {images_downloaded} images downloaded")
-            except Exception as e:
-                print(f"❌ Error with {source_name}: {e}")
-                continue
-
-        # Create category-specific images
-        self.create_category_images()
+        print_summary(results)
+        total_images = sum(result["downloaded"] for name, result in results.items() if name != "Featured")
 
-        # Create banner images
-        self.create_banner_images()
+        self.blobs.save()
 
         print("=" * 50)
-        print(f"✅ Scraping complete! Total images: {total_images}")
+        print(f"✅ Scraping complete! Total images: {total_images} in {pipeline.elapsed:.1f}s")
         print(f"📁 Images saved to: {self.base_dir}")
 
         return total_images
@@ -312,30 +353,17 @@ def main():
     parser = argparse.ArgumentParser(description='Scrape liquor product images')
     parser.add_argument('--output', '-o', default='images', help='Output directory')
     parser.add_argument('--max-images', '-m', type=int, default=50, help='Maximum images to download')
+    parser.add_argument('--workers', '-w', type=int, default=8, help='Concurrent download workers')
 
     args = parser.parse_args()
 
-    scraper = LiquorImageScraper(args.output)
-
-    # Update the scraper functions to respect max_images
-    original_wine_com = scraper.scrape_wine_com
-    def limited_wine_com():
-        return original_wine_com(args.max_images // 4)
-
-    original_unsplash = scraper.scrape_unsplash_liquor
-    def limited_unsplash():
-        return original_unsplash(args.max_images // 3)
-
-    original_pexels = scraper.scrape_pexels_liquor
-    def limited_pexels():
-        return original_pexels(args.max_images // 4)
-
-    # Replace functions
-    scraper.scrape_wine_com = limited_wine_com
-    scraper.scrape_unsplash_liquor = limited_unsplash
-    scraper.scrape_pexels_liquor = limited_pexels
+    scraper = LiquorImageScraper(args.output, max_workers=args.workers)
 
-    scraper.run_scraping()
+    scraper.run_scraping(limits={
+        "Wine.com": args.max_images // 4,
+        "Unsplash": args.max_images // 3,
+        "Pexels": args.max_images // 4
+    })
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -5,17 +5,45 @@ Downloads additional liquor images from various free sources
 """
 
 import requests
-import os
-import time
-import json
-from urllib.parse import urljoin, urlparse
-from bs4 import BeautifulSoup
 import re
 from pathlib import Path
+from functools import partial
+from itertools import islice
 import random
+import bisect
+
+from download_engine import DownloadEngine, NOT_MODIFIED, stream_download
+from rate_limiter import CircuitOpenError
+from http_cache import HTTPCache
+from blob_store import BlobStore, LINKED
+from image_manifest import ImageManifest
+from image_probe import MIN_DIMENSIONS
+from job_journal import JobJournal
+from listing_parser import iter_images
+from scrape_pipeline import ScrapePipeline, Source, print_summary
+
+# Product-name keywords that sort a product into each category
+CATEGORY_KEYWORDS = {
+    'wine': ['wine', 'cabernet', 'chardonnay', 'merlot', 'pinot', 'casillero', 'concha', 'santa'],
+    'whiskey': ['whiskey', 'whisky', 'glenfiddich', 'jameson', 'jack', 'scotch', 'bourbon', 'irish'],
+    'cognac': ['cognac', 'hennessy', 'remy', 'courvoisier', 'martell'],
+    'rum': ['rum', 'havana', 'bacardi', 'mount', 'malibu', 'zacapa'],
+    'vodka': ['vodka', 'absolut', 'smirnoff', 'grey', 'belvedere', 'ciroc'],
+    'gin': ['gin', 'tanqueray', 'bombay', 'hendrick', 'beefeater'],
+    'champagne': ['champagne', 'moet', 'veuve', 'dom', 'krug']
+}
+
+# Organized copies kept per category
+IMAGES_PER_CATEGORY = 5
+
+# Images to download from each listing source unless the caller says otherwise
+LISTING_LIMITS = {
+    "Pixabay": 20,
+    "FreeImages": 15
+}
 
 class EnhancedLiquorImageScraper:
-    def __init__(self, base_dir="images"):
+    def __init__(self, base_dir="images", max_workers=8):
         self.base_dir = Path(base_dir)
         self.session = requests.Session()
 
@@ -29,35 +57,62 @@ class EnhancedLiquorImageScraper:
             'User-Agent': random.choice(user_agents)
         })
 
+        # Shared download pool with per-host limits (replaces fixed sleeps)
+        self.engine = DownloadEngine(max_workers=max_workers)
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        # Validators from earlier runs turn unchanged downloads into no-ops
+        self.cache = HTTPCache(self.base_dir / ".http_cache")
+
+        # Each unique payload is stored once; named files are hardlinks to it
+        self.blobs = BlobStore(self.base_dir / ".blobs")
+
+        # Per-asset metadata, recorded as each download or copy completes
+        self.manifest = ImageManifest(self.base_dir)
+
+        # Planned/in-flight/finished jobs, so an interrupted run resumes where it stopped
+        self.journal = JobJournal(self.base_dir)
+
         self.products_dir = self.base_dir / "products"
         self.categories_dir = self.base_dir / "categories"
         self.banners_dir = self.base_dir / "banners"
 
-    def download_image(self, url, filename, min_size=5000):
-        """Download an image with size validation and retries"""
-        try:
-            response = self.session.get(url, timeout=15)
-            response.raise_for_status()
+        for dir_path in [self.products_dir, self.categories_dir, self.banners_dir]:
+            dir_path.mkdir(parents=True, exist_ok=True)
 
-            content_type = response.headers.get('content-type', '')
-            if not content_type.startswith('image/'):
-                return False
+        # Products the streaming organize stage matched per category, in name order
+        self.organized = {}
 
-            if len(response.content) < min_size:
+    def download_image(self, url, filename, min_size=5000, deadline=None):
+        """Download an image with size validation and retries; raises with the reason when it fails"""
+        try:
+            download = partial(stream_download, self.session, min_size=min_size, timeout=15,
+                               cache=self.cache, blobs=self.blobs, min_dimensions=MIN_DIMENSIONS,
+                               journal=self.journal, deadline=deadline)
+            # Retries with backoff and honours the host's rate limit and circuit
+            fetch = partial(self.engine.call, download)
+            result = self.blobs.fetch_once(url, filename, fetch)
+            if not result:
                 return False
 
-            with open(filename, 'wb') as f:
-                f.write(response.content)
+            self.manifest.record(filename, url=url, digest=self.blobs.digest_of(filename), fetched=True)
 
-            print(f"✓ Downloaded: {filename.name}")
+            if result == LINKED:
+                print(f"🔗 Linked: {filename.name}")
+            elif result == NOT_MODIFIED:
+                print(f"↺ Unchanged: {filename.name}")
+            else:
+                print(f"✓ Downloaded: {filename.name}")
             return True
 
         except Exception as e:
             print(f"✗ Failed to download {url}: {e}")
-            return False
+            raise
 
-    def scrape_pixabay_liquor(self, max_images=20):
-        """Scrape liquor images from Pixabay"""
+    def scrape_pixabay_liquor(self):
+        """Yield download jobs from Pixabay listing pages"""
         print("📸 Scraping Pixabay...")
 
         search_terms = [
@@ -66,91 +121,67 @@ class EnhancedLiquorImageScraper:
             "whiskey glass", "wine collection", "liquor bottles"
         ]
 
-        image_count = 0
+        found = 0
 
         for term in search_terms:
-            if image_count >= max_images:
-                break
+            # Pixabay API approach (but using search page for simplicity)
+            search_query = term.replace(" ", "+")
+            url = f"https://pixabay.com/images/search/{search_query}/"
 
             try:
-                # Pixabay API approach (but using search page for simplicity)
-                search_query = term.replace(" ", "+")
-                url = f"https://pixabay.com/images/search/{search_query}/"
-
-                response = self.session.get(url, timeout=10)
-                response.raise_for_status()
-
-                soup = BeautifulSoup(response.content, 'html.parser')
-
-                # Find image containers
-                images = soup.find_all('img', {'srcset': True})
-
-                for img in images[:2]:  # Limit per search term
-                    if image_count >= max_images:
-                        break
-
-                    img_url = img.get('src')
-                    if img_url and 'pixabay.com' in img_url:
-                        # Get higher quality version
-                        img_url = img_url.replace('340.jpg', '640.jpg')
-
-                        filename = self.products_dir / f"pixabay_{term.replace(' ', '_')}_{image_count + 1}.jpg"
-
-                        if self.download_image(img_url, filename, min_size=10000):
-                            image_count += 1
-
-                time.sleep(2)  # Be respectful
-
+                response = self.engine.fetch(self.session, url, timeout=10)
+            except CircuitOpenError as e:
+                print(f"⚠️ Giving up on Pixabay: {e}")
+                break
             except Exception as e:
                 print(f"Error scraping Pixabay {term}: {e}")
                 continue
 
-        return image_count
+            # Find image containers
+            images = iter_images(response.content, {'srcset': True})
 
-    def scrape_freeimages_liquor(self, max_images=15):
-        """Scrape liquor images from FreeImages"""
+            for img in islice(images, 2):  # Limit per search term
+                img_url = img.get('src')
+                if img_url and 'pixabay.com' in img_url:
+                    # Get higher quality version
+                    img_url = img_url.replace('340.jpg', '640.jpg')
+
+                    filename = self.products_dir / f"pixabay_{term.replace(' ', '_')}_{found + 1}.jpg"
+                    found += 1
+                    yield img_url, filename, 10000
+
+    def scrape_freeimages_liquor(self):
+        """Yield download jobs from FreeImages listing pages"""
         print("🖼️ Scraping FreeImages...")
 
         search_terms = ["wine", "whiskey", "cognac", "rum", "vodka", "gin", "champagne"]
 
-        image_count = 0
+        found = 0
 
         for term in search_terms:
-            if image_count >= max_images:
-                break
+            url = f"https://www.freeimages.com/search/{term}"
 
             try:
-                url = f"https://www.freeimages.com/search/{term}"
-
-                response = self.session.get(url, timeout=10)
-                response.raise_for_status()
-
-                soup = BeautifulSoup(response.content, 'html.parser')
-
-                # Find image links
-                images = soup.find_all('img', {'class': re.compile(r'img-responsive')})
-
-                for img in images[:2]:
-                    if image_count >= max_images:
-                        break
-
-                    img_url = img.get('src')
-                    if img_url and 'freeimages.com' in img_url:
-                        filename = self.products_dir / f"freeimages_{term}_{image_count + 1}.jpg"
-
-                        if self.download_image(img_url, filename, min_size=8000):
-                            image_count += 1
-
-                time.sleep(1.5)
-
+                response = self.engine.fetch(self.session, url, timeout=10)
+            except CircuitOpenError as e:
+                print(f"⚠️ Giving up on FreeImages: {e}")
+                break
             except Exception as e:
                 print(f"Error scraping FreeImages {term}: {e}")
                 continue
 
-        return image_count
+            # Find image links
+            images = iter_images(response.content, {'class': re.compile(r'img-responsive')})
 
-    def download_specific_liquor_images(self):
-        """Download specific high-quality liquor images from reliable sources"""
+            for img in islice(images, 2):
+                img_url = img.get('src')
+                if img_url and 'freeimages.com' in img_url:
+                    filename = self.products_dir / f"freeimages_{term}_{found + 1}.jpg"
+                    found += 1
+                    yield img_url, filename, 8000
+
+    def specific_liquor_jobs(self):
+        """Download jobs for the specific liquor images"""
         print("🍷 Downloading specific liquor product images...")
 
         # Curated list of free-to-use liquor images
@@ -186,18 +217,20 @@ class EnhancedLiquorImageScraper:
             "moet_chandon.jpg": "https://images.unsplash.com/photo-1514362545857-3bc16c4c7d1b?w=400"
         }
 
-        success_count = 0
-        for filename, url in liquor_images.items():
-            filepath = self.products_dir / filename
-            if self.download_image(url, filepath, min_size=5000):
-                success_count += 1
-            time.sleep(0.5)  # Small delay between downloads
+        return [
+            (url, self.products_dir / filename, 5000)
+            for filename, url in liquor_images.items()
+        ]
+
+    def download_specific_liquor_images(self):
+        """Download specific high-quality liquor images from reliable sources"""
+        success_count = self.engine.download_all(self.download_image, self.specific_liquor_jobs())
 
         print(f"✓ Downloaded {success_count} specific liquor images")
         return success_count
 
-    def download_category_backgrounds(self):
-        """Download background images for categories"""
+    def category_background_jobs(self):
+        """Download jobs for the category backgrounds"""
         print("🎨 Downloading category background images...")
 
         category_backgrounds = {
@@ -210,18 +243,20 @@ class EnhancedLiquorImageScraper:
             "champagne_bg.jpg": "https://images.unsplash.com/photo-1514362545857-3bc16c4c7d1b?w=800&h=600"
         }
 
-        success_count = 0
-        for filename, url in category_backgrounds.items():
-            filepath = self.categories_dir / filename
-            if self.download_image(url, filepath, min_size=20000):
-                success_count += 1
-            time.sleep(0.5)
+        return [
+            (url, self.categories_dir / filename, 20000)
+            for filename, url in category_backgrounds.items()
+        ]
+
+    def download_category_backgrounds(self):
+        """Download background images for categories"""
+        success_count = self.engine.download_all(self.download_image, self.category_background_jobs())
 
         print(f"✓ Downloaded {success_count} category backgrounds")
         return success_count
 
-    def download_hero_banners(self):
-        """Download high-quality hero banner images"""
+    def hero_banner_jobs(self):
+        """Download jobs for the hero banners"""
         print("🖼️ Downloading hero banner images...")
 
         banner_images = {
@@ -231,12 +266,14 @@ class EnhancedLiquorImageScraper:
             "hero_wine_tasting.jpg": "https://images.unsplash.com/photo-1551537482-f2075a1d41f2?w=1200&h=600"
         }
 
-        success_count = 0
-        for filename, url in banner_images.items():
-            filepath = self.banners_dir / filename
-            if self.download_image(url, filepath, min_size=30000):
-                success_count += 1
-            time.sleep(0.5)
+        return [
+            (url, self.banners_dir / filename, 30000)
+            for filename, url in banner_images.items()
+        ]
+
+    def download_hero_banners(self):
+        """Download high-quality hero banner images"""
+        success_count = self.engine.download_all(self.download_image, self.hero_banner_jobs())
 
         print(f"✓ Downloaded {success_count} hero banners")
         return success_count
@@ -245,21 +282,10 @@ class EnhancedLiquorImageScraper:
         """Organize downloaded images into proper categories"""
         print("📁 Organizing images into categories...")
 
-        # Get all product images
-        product_images = list(self.products_dir.glob("*.jpg"))
-
-        # Define category mappings
-        category_mappings = {
-            'wine': ['wine', 'cabernet', 'chardonnay', 'merlot', 'pinot', 'casillero', 'concha', 'santa'],
-            'whiskey': ['whiskey', 'whisky', 'glenfiddich', 'jameson', 'jack', 'scotch', 'bourbon', 'irish'],
-            'cognac': ['cognac', 'hennessy', 'remy', 'courvoisier', 'martell'],
-            'rum': ['rum', 'havana', 'bacardi', 'mount', 'malibu', 'zacapa'],
-            'vodka': ['vodka', 'absolut', 'smirnoff', 'grey', 'belvedere', 'ciroc'],
-            'gin': ['gin', 'tanqueray', 'bombay', 'hendrick', 'beefeater'],
-            'champagne': ['champagne', 'moet', 'veuve', 'dom', 'krug']
-        }
+        # Get all product images, in name order so slots are stable
+        product_images = sorted(self.products_dir.glob("*.jpg"))
 
-        for category, keywords in category_mappings.items():
+        for category, keywords in CATEGORY_KEYWORDS.items():
             category_dir = self.categories_dir / category
             category_dir.mkdir(exist_ok=True)
 
@@ -271,98 +297,106 @@ class EnhancedLiquorImageScraper:
                     matching_images.append(img)
 
             # Copy matching images to category directory
-            for i, src_img in enumerate(matching_images[:5]):  # Limit to 5 per category
+            for i, src_img in enumerate(matching_images[:IMAGES_PER_CATEGORY]):
                 dst_name = f"{category}_{i+1}.jpg"
                 dst_path = category_dir / dst_name
 
                 try:
-                    with open(src_img, 'rb') as fsrc:
-                        with open(dst_path, 'wb') as fdst:
-                            fdst.write(fsrc.read())
+                    self.blobs.place(src_img, dst_path)
+                    self.manifest.record_copy(src_img, dst_path)
                     print(f"✓ Organized: {dst_name}")
                 except Exception as e:
                     print(f"✗ Failed to organize {dst_name}: {e}")
 
-    def create_image_index(self):
-        """Create an index file showing all available images"""
-        print("📋 Creating image index...")
+    def organize_image(self, src):
+        """Organize one freshly downloaded product into every category it matches"""
+        if src.parent != self.products_dir:
+            return
 
-        index_data = {
-            "products": [],
-            "categories": {},
-            "banners": []
-        }
+        img_name = src.name.lower()
+        for category, keywords in CATEGORY_KEYWORDS.items():
+            matches = self.organized.setdefault(category, [])
+            if src in matches or not any(keyword in img_name for keyword in keywords):
+                continue
 
-        # Index product images
-        for img_path in self.products_dir.glob("*.jpg"):
-            index_data["products"].append(img_path.name)
+            # Slots follow product names, as in organize_images, not arrival
+            # order: an earlier name takes its slot and shifts the rest on
+            bisect.insort(matches, src)
+            category_dir = self.categories_dir / category
+            category_dir.mkdir(exist_ok=True)
+            for i in range(matches.index(src), min(len(matches), IMAGES_PER_CATEGORY)):
+                dst_name = f"{category}_{i + 1}.jpg"
+                try:
+                    self.blobs.place(matches[i], category_dir / dst_name)
+                    self.manifest.record_copy(matches[i], category_dir / dst_name)
+                    print(f"✓ Organized: {dst_name}")
+                except Exception as e:
+                    print(f"✗ Failed to organize {dst_name}: {e}")
+
+    def update_index(self):
+        self.manifest.export_index(self.base_dir / "image_index.json")
 
-        # Index category images
-        for category_dir in self.categories_dir.iterdir():
-            if category_dir.is_dir():
-                category_images = []
-                for img_path in category_dir.glob("*.jpg"):
-                    category_images.append(img_path.name)
-                index_data["categories"][category_dir.name] = category_images
+    def create_image_index(self):
+        """Create an index file showing all available images"""
+        print("📋 Creating image index...")
 
-        # Index banner images
-        for img_path in self.banners_dir.glob("*.jpg"):
-            index_data["banners"].append(img_path.name)
+        # Downloads and copies were recorded as they happened; only pick up
+        # directories that changed some other way since the last snapshot
+        result = self.manifest.reconcile()
+        print(f"↺ Rescanned {result['rescanned']}/{result['directories']} changed directories")
 
-        # Save index as JSON
-        with open(self.base_dir / "image_index.json", 'w') as f:
-            json.dump(index_data, f, indent=2)
+        index_data = self.manifest.export_index(self.base_dir / "image_index.json")
 
         print("✓ Image index created: image_index.json")
         return index_data
 
-    def run_full_scraping(self):
-        """Run the complete enhanced scraping process"""
+    def run_full_scraping(self, limits=None):
+        """Run the complete enhanced scraping process; limits caps downloaded images per listing source"""
         print("🚀 Starting enhanced liquor image scraping...")
         print("=" * 60)
 
-        total_images = 0
-
-        # Download specific liquor images
-        total_images += self.download_specific_liquor_images()
-        time.sleep(2)
-
-        # Download category backgrounds
-        total_images += self.download_category_backgrounds()
-        time.sleep(2)
+        # The pipeline exports the index as files land; bring the manifest in
+        # line with the disk first so those exports keep earlier runs' images
+        result = self.manifest.reconcile()
+        print(f"↺ Rescanned {result['rescanned']}/{result['directories']} changed directories")
 
-        # Download hero banners
-        total_images += self.download_hero_banners()
-        time.sleep(2)
+        limits = limits or {}
 
-        # Try additional sources
+        # Sources list concurrently (the engine still paces each host) and
+        # stream through one pipeline, so each stage starts on the first image
+        listings = {
+            "Pixabay": self.scrape_pixabay_liquor,
+            "FreeImages": self.scrape_freeimages_liquor
+        }
         sources = [
-            ("Pixabay", self.scrape_pixabay_liquor),
-            ("FreeImages", self.scrape_freeimages_liquor)
+            Source("Curated products", self.specific_liquor_jobs),
+            Source("Category backgrounds", self.category_background_jobs),
+            Source("Hero banners", self.hero_banner_jobs)
         ]
+        sources += [
+            Source(name, jobs, limit=limits.get(name, LISTING_LIMITS[name]), numbered=True)
+            for name, jobs in listings.items()
+        ]
+        pipeline = ScrapePipeline(self.download_image, organize=self.organize_image, index=self.update_index,
+                                  workers=self.engine.max_workers, journal=self.journal)
+        results = pipeline.run(sources)
 
-        for source_name, scraper_func in sources:
-            try:
-                images_downloaded = scraper_func()
-                total_images += images_downloaded
-                print(f"📊 {source_name}: {images_downloaded} images downloaded")
-            except Exception as e:
-                print(f"❌ Error with {source_name}: {e}")
-                continue
-
-        # Organize images
-        self.organize_images()
+        print_summary(results)
+        total_images = sum(result["downloaded"] for result in results.values())
 
-        # Create index
+        # Final reconcile picks up anything changed outside the pipeline
         index_data = self.create_image_index()
+        self.blobs.save()
+        blob_stats = self.blobs.stats()
 
         print("=" * 60)
-        print(f"✅ Enhanced scraping complete! Total images: {total_images}")
+        print(f"✅ Enhanced scraping complete! Total images: {total_images} in {pipeline.elapsed:.1f}s")
         print(f"📁 Images organized in: {self.base_dir}")
         print("\n📈 Summary:")
         print(f"   Products: {len(index_data['products'])}")
         print(f"   Categories: {len(index_data['categories'])}")
         print(f"   Banners: {len(index_data['banners'])}")
+        print(f"   Unique payloads: {blob_stats['blobs']} for {blob_stats['names']} files")
 
         return total_images
 
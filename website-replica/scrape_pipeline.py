@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Streaming Scrape Pipeline
+Runs listing-page parsing, downloads, organizing and index export as
+concurrent stages joined by bounded queues, so each image is organized and
+indexed as soon as it lands instead of after every source has finished.
+Every source lists on its own thread until its limit of successful
+downloads is met or its deadline passes, and an optional job journal lets
+an interrupted run skip what it finished.
+"""
+
+import queue
+import threading
+import time
+
+# Items a stage may run ahead of the next; a full queue pauses the producer
+QUEUE_SIZE = 32
+
+# Seconds between index exports while downloads are still arriving
+INDEX_INTERVAL = 2.0
+
+# Seconds a source may spend before its remaining jobs are dropped
+SOURCE_TIMEOUT = 300.0
+
+_DONE = object()
+
+class Source:
+    """A named job generator with its own download limit and deadline.
+
+    limit counts successful downloads: a failed job frees its place for the
+    next one the generator yields.
+
+    numbered marks generated file names ending in a _N counter, which the
+    journal may renumber; other names are fixed and kept as given.
+    """
+
+    def __init__(self, name, jobs, limit=None, timeout=SOURCE_TIMEOUT, numbered=False):
+        self.name = name
+        self.jobs = jobs
+        self.limit = limit
+        self.timeout = timeout
+        self.numbered = numbered
+
+class ScrapePipeline:
+    """Listing → download → organize → index, each stage on its own threads"""
+
+    def __init__(self, download, organize=None, index=None, workers=8, queue_size=QUEUE_SIZE,
+                 index_interval=INDEX_INTERVAL, journal=None):
+        self.download = download
+        self.organize = organize
+        self.index = index
+        self.journal = journal
+        self.workers = workers
+        self.index_interval = index_interval
+
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.downloaded = queue.Queue(maxsize=queue_size)
+        self.organized = queue.Queue(maxsize=queue_size)
+
+        self.results = {}
+        self.elapsed = 0.0
+        self._deadlines = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        # Signalled whenever a job finishes, so listers waiting on a limit re-check it
+        self._finished = threading.Condition(self._lock)
+
+    def _expired(self, name):
+        deadline = self._deadlines[name]
+        return deadline is not None and time.monotonic() > deadline
+
+    def _record(self, name, key, error=None):
+        """Count a finished job under key and wake listers waiting for room"""
+        with self._finished:
+            result = self.results[name]
+            result[key] += 1
+            if error:
+                result["errors"].append(error)
+            self._pending[name] -= 1
+            self._finished.notify_all()
+
+    def _reserve(self, source):
+        """Wait until source may queue another job; False once its limit is met or its deadline passes"""
+        result = self.results[source.name]
+        with self._finished:
+            while not self._expired(source.name):
+                succeeded = result["downloaded"] + result["resumed"]
+                if source.limit is not None and succeeded >= source.limit:
+                    return False
+                if source.limit is None or succeeded + self._pending[source.name] < source.limit:
+                    self._pending[source.name] += 1
+                    result["queued"] += 1
+                    return True
+                deadline = self._deadlines[source.name]
+                self._finished.wait(timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+            result["timed_out"] = True
+            return False
+
+    def _release(self, name):
+        """Give back a reservation that was not used for a job"""
+        with self._finished:
+            self._pending[name] -= 1
+            self.results[name]["queued"] -= 1
+
+    def _list(self, source):
+        """Pull (url, filename, min_size) jobs from one source into the download queue"""
+        result = self.results[source.name]
+        try:
+            jobs = iter(source.jobs())
+            while self._reserve(source):
+                job = next(jobs, None)
+                if job is None:
+                    self._release(source.name)
+                    break
+
+                url, filename, min_size = job
+                if self.journal:
+                    # Stable names across runs instead of restarting the counters
+                    filename = self.journal.plan(url, filename, numbered=source.numbered)
+                self.jobs.put((source.name, url, filename, min_size))
+        except Exception as e:
+            print(f"❌ Error with {source.name}: {e}")
+            with self._lock:
+                result["errors"].append(f"listing: {e}")
+
+    def _download(self):
+        while True:
+            job = self.jobs.get()
+            if job is _DONE:
+                return
+
+            name, url, filename, min_size = job
+            if self._expired(name):
+                self.results[name]["timed_out"] = True
+                self._record(name, "skipped")
+                continue
+
+            if self.journal and self.journal.is_done(url, filename):
+                # Finished before this run was interrupted; still organize and index it
+                self._record(name, "resumed")
+                self.downloaded.put(filename)
+                continue
+
+            try:
+                # A transfer still running at the deadline is cut off there
+                downloaded = self.download(url, filename, min_size, deadline=self._deadlines[name])
+                error = None
+            except Exception as e:
+                # The download callable reports its own failures; keep the reason
+                downloaded, error = False, e
+
+            if downloaded:
+                if self.journal:
+                    self.journal.finish(url, filename)
+                self._record(name, "downloaded")
+                self.downloaded.put(filename)
+            else:
+                if self.journal:
+                    self.journal.fail(url, filename, error)
+                self._record(name, "failed", f"{filename.name}: {error}" if error else None)
+
+    def _organize(self):
+        while True:
+            filename = self.downloaded.get()
+            if filename is not _DONE and self.organize:
+                try:
+                    self.organize(filename)
+                except Exception as e:
+                    print(f"✗ Failed to organize {filename.name}: {e}")
+
+            self.organized.put(filename)
+            if filename is _DONE:
+                return
+
+    def _index(self):
+        """Export the index every index_interval seconds while new files keep arriving"""
+        pending = 0
+        last_export = time.monotonic()
+        while True:
+            try:
+                filename = self.organized.get(timeout=self.index_interval)
+            except queue.Empty:
+                filename = None
+
+            if filename is not None and filename is not _DONE:
+                pending += 1
+
+            due = filename is _DONE or time.monotonic() - last_export >= self.index_interval
+            if pending and due and self.index:
+                try:
+                    self.index()
+                except Exception as e:
+                    print(f"✗ Failed to update index: {e}")
+                pending = 0
+                last_export = time.monotonic()
+
+            if filename is _DONE:
+                return
+
+    def run(self, sources):
+        """Stream every Source through the stages concurrently; returns per-source results"""
+        sources = list(sources)
+        start = time.monotonic()
+        self.results = {
+            source.name: {"queued": 0, "downloaded": 0, "resumed": 0, "failed": 0, "skipped": 0, "errors": [],
+                          "timed_out": False}
+            for source in sources
+        }
+        self._deadlines = {source.name: start + source.timeout if source.timeout else None for source in sources}
+        self._pending = {source.name: 0 for source in sources}
+
+        listers = [threading.Thread(target=self._list, args=(source,), name=f"listing-{source.name}")
+                   for source in sources]
+        downloaders = [threading.Thread(target=self._download, name=f"download-{i}") for i in range(self.workers)]
+        consumers = [threading.Thread(target=self._organize, name="organize"),
+                     threading.Thread(target=self._index, name="index")]
+
+        if self.journal:
+            self.journal.begin_run()
+
+        for thread in listers + downloaders + consumers:
+            thread.start()
+
+        for thread in listers:
+            thread.join()
+        for _ in downloaders:
+            self.jobs.put(_DONE)
+        for thread in downloaders:
+            thread.join()
+
+        self.downloaded.put(_DONE)
+        for thread in consumers:
+            thread.join()
+
+        if self.journal:
+            # Only an interrupted run resumes; the next full run revalidates everything
+            self.journal.complete_run()
+
+        self.elapsed = time.monotonic() - start
+        return self.results
+
+def print_summary(results):
+    """Print the merged per-source outcome of a pipeline run"""
+    for name, result in results.items():
+        line = f"📊 {name}: {result['downloaded']} images downloaded"
+        if result["resumed"]:
+            line += f", {result['resumed']} already done"
+        if result["failed"]:
+            line += f", {result['failed']} failed"
+        if result["timed_out"]:
+            line += f", timed out ({result['skipped']} skipped)"
+        print(line)
+        for error in result["errors"][:3]:
+            print(f"   ⚠️ {error}")
+        if len(result["errors"]) > 3:
+            print(f"   ⚠️ ... and {len(result['errors']) - 3} more")
@@ -4,155 +4,399 @@ Update HTML files to use downloaded images
 Replaces placeholder gradients with actual product images
 """
 
+import argparse
+import hashlib
 import json
 import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import re
 
-class HTMLImageUpdater:
-    def __init__(self, base_dir=".", images_dir="images"):
-        self.base_dir = Path(base_dir)
-        self.images_dir = Path(images_dir)
-
-        # Load image index
-        with open(self.images_dir / "image_index.json", 'r') as f:
-            self.image_index = json.load(f)
-
-    def update_homepage_hero(self):
-        """Update homepage hero section with banner image"""
-        homepage = self.base_dir / "index.html"
-
-        if not homepage.exists():
-            print("❌ Homepage not found")
-            return False
+import lxml.html
 
-        with open(homepage, 'r', encoding='utf-8') as f:
-            content = f.read()
+from file_placement import atomic_write
 
-        # Replace hero section background
-        hero_pattern = r'(<section class="hero">)'
-        hero_replacement = r'<section class="hero" style="background-image: linear-gradient(135deg, rgba(245, 158, 11, 0.1), rgba(220, 38, 38, 0.1)), url(\'images/banners/hero_wine_collection.jpg\'); background-size: cover; background-position: center;">'
+# Rendered CSS width of each tile type, used to pick 1x/2x derivatives
+TILE_WIDTHS = {
+    "product": 320,
+    "category": 640,
+    "hero": 1280,
+}
 
-        content = re.sub(hero_pattern, hero_replacement, content)
+MIME_TYPES = {
+    "avif": "image/avif",
+    "webp": "image/webp",
+    "jpeg": "image/jpeg",
+}
 
-        with open(homepage, 'w', encoding='utf-8') as f:
-            f.write(content)
+PRODUCT_IMAGES = {
+    "Whisky Macallan 18 Años": "macallan_18.jpg",
+    "Vino Cabernet Sauvignon": "cabernet_sauvignon.jpg",
+    "Coñac Hennessy VSOP": "hennessy_vsop.jpg",
+    "Ron Zacapa 23": "zacapa_23.jpg",
+    "Tanqueray London Dry": "tanqueray_gin.jpg",
+    "Gin Tanqueray London Dry": "tanqueray_gin.jpg"
+}
 
-        print("✓ Updated homepage hero section")
-        return True
+# Keyed by the titles wishlist.html actually renders
+WISHLIST_IMAGES = {
+    "Macallan 18 Años Single Malt": "macallan_18.jpg",
+    "Cabernet Sauvignon Maipo Valley": "cabernet_sauvignon.jpg",
+    "Hennessy VSOP Privilege": "hennessy_vsop.jpg",
+    "Zacapa 23 Centenario": "zacapa_23.jpg",
+    "Tanqueray London Dry": "tanqueray_gin.jpg"
+}
 
-    def update_product_images(self):
-        """Update product images in various pages"""
-        product_mapping = {
-            "Whisky Macallan 18 Años": "macallan_18.jpg",
-            "Vino Cabernet Sauvignon": "cabernet_sauvignon.jpg",
-            "Coñac Hennessy VSOP": "hennessy_vsop.jpg",
-            "Ron Zacapa 23": "zacapa_23.jpg",
-            "Tanqueray London Dry": "tanqueray_gin.jpg"
-        }
+CATEGORY_BACKGROUNDS = {
+    "Vinos": "wine_bg.jpg",
+    "Whiskies": "whiskey_bg.jpg",
+    "Coñacs": "cognac_bg.jpg",
+    "Rones": "rum_bg.jpg",
+    "Vodkas": "vodka_bg.jpg",
+    "Gins": "gin_bg.jpg",
+    "Champagnes": "champagne_bg.jpg"
+}
 
-        # Update homepage
-        self._update_page_product_images("index.html", product_mapping)
+# title class -> (image class, mapping, images subdirectory, tile type)
+TILE_RULES = {
+    "product-title": ("product-image", PRODUCT_IMAGES, "products", "product"),
+    "item-title": ("item-image", WISHLIST_IMAGES, "products", "product"),
+    "category-title": ("category-image", CATEGORY_BACKGROUNDS, "categories", "category"),
+}
 
-        # Update products page
-        self._update_page_product_images("productos.html", product_mapping)
+# page -> rules applied to it ("hero" plus title classes from TILE_RULES)
+PAGE_RULES = {
+    "index.html": ["hero", "product-title"],
+    "productos.html": ["product-title"],
+    "carrito.html": ["product-title"],
+    "checkout.html": ["product-title"],
+    "categorias.html": ["category-title"],
+    "wishlist.html": ["item-title"],
+}
 
-        # Update cart page
-        self._update_page_product_images("carrito.html", product_mapping)
+# Image div the old per-product regex pass inserted (never closed) after each title
+LEGACY_INJECTION = re.compile(
+    r'(<(h[234]) class="(product|item|category)-title">[^<]*</\2>)\s*\n\s*<div class="\3-image" style="[^"]*">'
+)
+
+# libxml2 lowercases attribute names; SVG needs these back in camelCase
+SVG_ATTRIBUTES = {
+    "viewbox": "viewBox",
+    "preserveaspectratio": "preserveAspectRatio",
+    "gradientunits": "gradientUnits",
+    "gradienttransform": "gradientTransform",
+    "patternunits": "patternUnits",
+    "stddeviation": "stdDeviation",
+}
 
-        # Update checkout page
-        self._update_page_product_images("checkout.html", product_mapping)
+# Bump when the rewrite logic changes so stored build state is invalidated
+BUILD_VERSION = 1
+
+# Markers around the generated block in styles.css, so reruns replace it
+CSS_BLOCK_START = "/* BEGIN image optimization (generated by update_html_images.py) */"
+CSS_BLOCK_END = "/* END image optimization */"
+LEGACY_CSS_BLOCK = "/* Image optimization */"
+LEGACY_CSS_LAST_RULE = "/* Image lazy loading fallback */"
+
+def content_digest(data):
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+def strip_legacy_css(content):
+    """Remove the unmarked block older runs appended, plus the stray brace after it"""
+    start = content.find(LEGACY_CSS_BLOCK)
+    last_rule = content.find(LEGACY_CSS_LAST_RULE, start)
+    if start == -1 or last_rule == -1:
+        return content
+
+    end = content.index('}', last_rule) + 1
+    stray = re.match(r'\s*\}', content[end:])
+    if stray:
+        end += stray.end()
+    return content[:start].rstrip() + "\n\n" + content[end:].lstrip("\n")
+
+def write_if_changed(path, content):
+    """Atomically replace a file, skipping the write when nothing changed"""
+    path = Path(path)
+    if path.exists():
+        with open(path, 'r', encoding='utf-8') as f:
+            if f.read() == content:
+                return False
+
+    atomic_write(path, content)
+    return True
+
+def parse_page(content):
+    """Parse page source into an lxml document"""
+    # Undo the unclosed divs the old regex updater inserted, before they skew the tree
+    content = LEGACY_INJECTION.sub(r'\1', content)
+
+    # libxml2 drops anything after </html>; move appended tags into <body>
+    head, html_end, trailing = content.rpartition('</html>')
+    if html_end and trailing.strip():
+        body, body_end, rest = head.rpartition('</body>')
+        content = f"{body}{trailing.strip()}\n{body_end}{rest}{html_end}\n"
+
+    return lxml.html.document_fromstring(content)
+
+def serialize_page(doc):
+    """Serialize a document once, restoring case-sensitive SVG attribute names"""
+    for svg in doc.iter('svg'):
+        for el in svg.iter():
+            if any(name in SVG_ATTRIBUTES for name in el.attrib):
+                attrs = list(el.attrib.items())
+                el.attrib.clear()
+                for name, value in attrs:
+                    el.set(SVG_ATTRIBUTES.get(name, name), value)
+
+    return lxml.html.tostring(doc, encoding='unicode', doctype='<!DOCTYPE html>') + "\n"
 
-        print("✓ Updated product images across pages")
-        return True
+class HTMLImageUpdater:
+    def __init__(self, base_dir=".", images_dir="images", force=False, max_workers=None):
+        self.base_dir = Path(base_dir)
+        self.images_dir = Path(images_dir)
+        self.force = force
+        self.max_workers = max_workers
 
-    def _update_page_product_images(self, page_name, product_mapping):
-        """Update product images in a specific page"""
+        # Load image index
+        with open(self.images_dir / "image_index.json", 'rb') as f:
+            index_bytes = f.read()
+        self.image_index = json.loads(index_bytes)
+        self.index_digest = content_digest(index_bytes)
+
+        # Input/output hashes per page from earlier runs
+        self.state_file = self.base_dir / ".build_state.json"
+        self.build_state = {"pages": {}}
+        if self.state_file.exists():
+            try:
+                with open(self.state_file, 'r') as f:
+                    self.build_state = json.load(f)
+            except (OSError, ValueError):
+                pass
+        self.skipped_pages = []
+
+        self.derivatives = self.image_index.get("derivatives", {})
+        self.placeholders = self.image_index.get("placeholders", {})
+
+    def _image_set(self, rel_path, tile_width):
+        """Build an image-set() over the derivatives of an image, if any"""
+        entry = self.derivatives.get(rel_path)
+        if not entry:
+            return None
+
+        candidates = []
+        for fmt, variants in entry["variants"].items():
+            if not variants:
+                continue
+
+            chosen = []
+            for density in (1, 2):
+                fitting = [v for v in variants if v["width"] >= tile_width * density]
+                variant = fitting[0] if fitting else variants[-1]
+                if variant not in chosen:
+                    chosen.append(variant)
+                    candidates.append(f"url('{self.images_dir.as_posix()}/{variant['path']}') type('{MIME_TYPES[fmt]}') {density}x")
+
+        return f"image-set({', '.join(candidates)})" if candidates else None
+
+    def _image_style(self, rel_path, tile="product", overlay=None):
+        """Build the inline background style for an indexed image"""
+        layers = [overlay] if overlay else []
+
+        url = f"url('{self.images_dir.as_posix()}/{rel_path}')"
+        image_set = self._image_set(rel_path, TILE_WIDTHS[tile])
+
+        # The inlined placeholder sits under the real image until it arrives;
+        # with two declarations it is held in a custom property so the data
+        # URI is written only once
+        style = ""
+        placeholder = self.placeholders.get(rel_path)
+        under = []
+        if placeholder and image_set:
+            style = f"--placeholder: url('{placeholder}'); "
+            under = ["var(--placeholder)"]
+        elif placeholder:
+            under = [f"url('{placeholder}')"]
+
+        style += f"background-image: {', '.join(layers + [url] + under)};"
+
+        # Browsers without image-set() keep the plain url() declaration
+        if image_set:
+            style += f" background-image: {', '.join(layers + [image_set] + under)};"
+
+        return style + " background-size: cover; background-position: center;"
+
+    def _inputs_digest(self, rules):
+        """Hash everything besides the page itself that affects a rewrite"""
+        inputs = {
+            "version": BUILD_VERSION,
+            "index": self.index_digest,
+            "images_dir": self.images_dir.as_posix(),
+            "rules": rules,
+            "tables": {rule: TILE_RULES[rule] for rule in rules if rule in TILE_RULES},
+        }
+        return content_digest(json.dumps(inputs, sort_keys=True, ensure_ascii=False))
+
+    def _save_state(self):
+        write_if_changed(self.state_file, json.dumps(self.build_state, indent=2, sort_keys=True) + "\n")
+
+    def _apply_hero(self, doc):
+        """Set the banner image on the hero section"""
+        hero_style = self._image_style(
+            "banners/hero_wine_collection.jpg", tile="hero",
+            overlay="linear-gradient(135deg, rgba(245, 158, 11, 0.1), rgba(220, 38, 38, 0.1))"
+        )
+
+        updated = 0
+        for section in doc.find_class("hero"):
+            if section.tag == "section":
+                section.set("style", hero_style)
+                updated += 1
+        return updated
+
+    def _apply_tiles(self, doc, title_classes):
+        """Set tile images in one pass over the title nodes of a document"""
+        rules = {cls: TILE_RULES[cls] for cls in title_classes}
+        updated = 0
+
+        for title in list(doc.iter('h2', 'h3', 'h4')):
+            classes = (title.get('class') or '').split()
+            rule = next((rules[cls] for cls in classes if cls in rules), None)
+            if rule is None:
+                continue
+
+            image_class, mapping, subdir, tile = rule
+            image_name = mapping.get(' '.join(title.text_content().split()))
+            if image_name is None:
+                continue
+
+            image_el = self._find_tile_image(title, image_class)
+            if image_el is None:
+                continue
+
+            image_el.set('style', self._image_style(f"{subdir}/{image_name}", tile=tile))
+            updated += 1
+
+        return updated
+
+    def _find_tile_image(self, title, image_class):
+        """Find the image element of the card that contains a title"""
+        for ancestor in title.iterancestors():
+            candidates = ancestor.find_class(image_class)
+            if candidates:
+                return candidates[0]
+            if ancestor.tag in ('body', 'main', 'section'):
+                return None
+        return None
+
+    def _rewrite_job(self, page_name, rules):
+        """Load, transform and write one page; runs in a worker process"""
         page_path = self.base_dir / page_name
-
         if not page_path.exists():
-            return False
+            return page_name, None, None
 
         with open(page_path, 'r', encoding='utf-8') as f:
             content = f.read()
 
-        # Replace product images with real ones
-        for product_name, image_name in product_mapping.items():
-            # Pattern to match the product name and replace the image div
-            pattern = rf'(<h3 class="product-title">{re.escape(product_name)}</h3>)'
-            replacement = f'<h3 class="product-title">{product_name}</h3>\n                <div class="product-image" style="background-image: url(\'images/products/{image_name}\'); background-size: cover; background-position: center;">'
+        # Skip pages that are exactly what we produced last time from the same inputs
+        inputs = self._inputs_digest(rules)
+        recorded = self.build_state["pages"].get(page_name)
+        if (not self.force and recorded and recorded["inputs"] == inputs
+                and recorded["output"] == content_digest(content)):
+            return page_name, recorded["images"], None
+
+        # Every transformation runs on the one in-memory tree
+        doc = parse_page(content)
+
+        updated = 0
+        if "hero" in rules:
+            updated += self._apply_hero(doc)
+        updated += self._apply_tiles(doc, [rule for rule in rules if rule in TILE_RULES])
+
+        output = serialize_page(doc)
+        if output != content:
+            atomic_write(page_path, output)
+
+        return page_name, updated, {
+            "inputs": inputs,
+            "output": content_digest(output),
+            "images": updated,
+        }
+
+    def rewrite_pages(self, jobs, max_workers=None):
+        """Rewrite (page, rules) jobs across a process pool and merge their build state"""
+        jobs = list(jobs)
+        max_workers = min(max_workers or self.max_workers or os.cpu_count(), len(jobs))
+
+        if max_workers <= 1:
+            results = [self._rewrite_job(page_name, rules) for page_name, rules in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(self._rewrite_job, *zip(*jobs)))
+
+        counts = {}
+        for page_name, updated, entry in results:
+            counts[page_name] = updated
+            if entry is None:
+                if updated is not None:
+                    self.skipped_pages.append(page_name)
+            else:
+                self.build_state["pages"][page_name] = entry
+
+        self._save_state()
+        return counts
+
+    def rewrite_page(self, page_name, rules=None):
+        """Parse a page once, apply its image rules and serialize it once"""
+        rules = PAGE_RULES.get(page_name, []) if rules is None else rules
+        return self.rewrite_pages([(page_name, rules)], max_workers=1)[page_name]
+
+    def rewrite_all_pages(self):
+        """Apply every image rule, touching each page exactly once"""
+        counts = self.rewrite_pages(PAGE_RULES.items())
+
+        for page_name, updated in counts.items():
+            if updated is None:
+                print(f"❌ {page_name} not found")
+            elif page_name in self.skipped_pages:
+                print(f"↺ {page_name} unchanged, skipped")
+            else:
+                print(f"✓ Updated {updated} images in {page_name}")
+        return True
 
-            content = re.sub(pattern, replacement, content)
+    def update_homepage_hero(self):
+        """Update homepage hero section with banner image"""
+        if self.rewrite_page("index.html", ["hero"]) is None:
+            print("❌ Homepage not found")
+            return False
+
+        print("✓ Updated homepage hero section")
+        return True
 
-        with open(page_path, 'w', encoding='utf-8') as f:
-            f.write(content)
+    def update_product_images(self):
+        """Update product images in various pages"""
+        pages = ("index.html", "productos.html", "carrito.html", "checkout.html")
+        self.rewrite_pages((page_name, ["product-title"]) for page_name in pages)
 
+        print("✓ Updated product images across pages")
         return True
 
     def update_category_backgrounds(self):
         """Update category pages with real background images"""
-        categories_page = self.base_dir / "categorias.html"
-
-        if not categories_page.exists():
+        if self.rewrite_page("categorias.html", ["category-title"]) is None:
             print("❌ Categories page not found")
             return False
 
-        with open(categories_page, 'r', encoding='utf-8') as f:
-            content = f.read()
-
-        # Update category background images
-        category_backgrounds = {
-            "Vinos": "wine_bg.jpg",
-            "Whiskies": "whiskey_bg.jpg",
-            "Coñacs": "cognac_bg.jpg",
-            "Rones": "rum_bg.jpg",
-            "Vodkas": "vodka_bg.jpg",
-            "Gins": "gin_bg.jpg",
-            "Champagnes": "champagne_bg.jpg"
-        }
-
-        for category_name, bg_image in category_backgrounds.items():
-            pattern = rf'(<h2 class="category-title">{re.escape(category_name)}</h2>)'
-            replacement = f'<h2 class="category-title">{category_name}</h2>\n                        <div class="category-image" style="background-image: url(\'images/categories/{bg_image}\'); background-size: cover; background-position: center;">'
-
-            content = re.sub(pattern, replacement, content)
-
-        with open(categories_page, 'w', encoding='utf-8') as f:
-            f.write(content)
-
         print("✓ Updated category backgrounds")
         return True
 
     def update_wishlist_images(self):
         """Update wishlist page with real product images"""
-        wishlist_page = self.base_dir / "wishlist.html"
-
-        if not wishlist_page.exists():
+        if self.rewrite_page("wishlist.html", ["item-title"]) is None:
             print("❌ Wishlist page not found")
             return False
 
-        with open(wishlist_page, 'r', encoding='utf-8') as f:
-            content = f.read()
-
-        # Map wishlist items to available images
-        wishlist_mapping = {
-            "Whisky Macallan 18 Años Single Malt": "macallan_18.jpg",
-            "Vino Cabernet Sauvignon Maipo Valley": "cabernet_sauvignon.jpg",
-            "Coñac Hennessy VSOP Privilege": "hennessy_vsop.jpg",
-            "Ron Zacapa 23 Centenario": "zacapa_23.jpg",
-            "Tanqueray London Dry": "tanqueray_gin.jpg"
-        }
-
-        for product_name, image_name in wishlist_mapping.items():
-            # Replace the background gradient with actual image
-            pattern = rf'(<h3 class="item-title">{re.escape(product_name)}</h3>)'
-            replacement = f'<h3 class="item-title">{product_name}</h3>\n                    <div class="item-image" style="background-image: url(\'images/products/{image_name}\'); background-size: cover; background-position: center;">'
-
-            content = re.sub(pattern, replacement, content)
-
-        with open(wishlist_page, 'w', encoding='utf-8') as f:
-            f.write(content)
-
         print("✓ Updated wishlist images")
         return True
 
@@ -168,8 +412,7 @@ class HTMLImageUpdater:
             content = f.read()
 
         # Add image optimization CSS
-        image_css = """
-/* Image optimization */
+        image_css = CSS_BLOCK_START + """
 .product-image, .item-image, .category-image {
     background-repeat: no-repeat;
     background-attachment: local;
@@ -203,15 +446,21 @@ class HTMLImageUpdater:
 .product-image, .item-image, .category-image {
     background-color: hsl(var(--secondary));
 }
-"""
-
-        # Insert before the final closing brace
-        content = content.rstrip() + "\n" + image_css + "\n}"
-
-        with open(css_file, 'w', encoding='utf-8') as f:
-            f.write(content)
-
-        print("✓ Added image optimization CSS")
+""" + CSS_BLOCK_END + "\n"
+
+        # Replace the generated block instead of appending another copy
+        if CSS_BLOCK_START in content:
+            before, _, rest = content.partition(CSS_BLOCK_START)
+            _, _, after = rest.partition(CSS_BLOCK_END)
+            content = before + image_css.rstrip("\n") + after
+        else:
+            # Older runs appended an unmarked block plus a stray closing brace
+            content = strip_legacy_css(content).rstrip() + "\n\n" + image_css
+
+        if write_if_changed(css_file, content):
+            print("✓ Added image optimization CSS")
+        else:
+            print("↺ Image optimization CSS already current")
         return True
 
     def create_image_preloader(self):
@@ -247,10 +496,10 @@ document.addEventListener('DOMContentLoaded', function() {
 """
 
         js_file = self.base_dir / "image-preloader.js"
-        with open(js_file, 'w', encoding='utf-8') as f:
-            f.write(preloader_js)
-
-        print("✓ Created image preloader script")
+        if write_if_changed(js_file, preloader_js):
+            print("✓ Created image preloader script")
+        else:
+            print("↺ Image preloader script already current")
         return True
 
     def update_all_pages(self):
@@ -259,10 +508,7 @@ document.addEventListener('DOMContentLoaded', function() {
         print("=" * 40)
 
         updates = [
-            ("Homepage hero", self.update_homepage_hero),
-            ("Product images", self.update_product_images),
-            ("Category backgrounds", self.update_category_backgrounds),
-            ("Wishlist images", self.update_wishlist_images),
+            ("Page images", self.rewrite_all_pages),
             ("CSS optimization", self.add_image_css_optimization),
             ("Image preloader", self.create_image_preloader)
         ]
@@ -284,6 +530,15 @@ document.addEventListener('DOMContentLoaded', function() {
 
         return successful_updates == len(updates)
 
+def main():
+    parser = argparse.ArgumentParser(description='Update HTML pages to use downloaded images')
+    parser.add_argument('--force', '-f', action='store_true', help='Rewrite pages even if their inputs are unchanged')
+    parser.add_argument('--workers', '-w', type=int, default=None, help='Worker processes (default: all cores)')
+
+    args = parser.parse_args()
+
+    updater = HTMLImageUpdater(force=args.force, max_workers=args.workers)
+    updater.update_all_pages()
+
 if __name__ == "__main__":
-    updater = HTMLImageUpdater()
-    updater.update_all_pages()
\ No newline at end of file
+    main()
\ No newline at end of file